@@ -5,6 +5,7 @@
 import requests
 import json
 import time
+from extractionJournal import get_run_key, journal_get, journal_put
 
 # This is used for api calls with headers set in each function along with the api key being passed from main
 def check_api_key(cxy_api_key):
@@ -45,12 +46,15 @@ def generate_updates_list(cxy_api_key:str, chain_id:int):
 
     return r_body['Records']
 
-def generate_downloads(cxy_api_key:str, scrape_update_list:list):
+def generate_downloads(cxy_api_key:str, scrape_update_list:list, journal_file:str=None):
     """
     Posts downloads on the CXY platform and prints out in console the list of scrapeids and the urls 
     Params:
     cxy_api_key:str - ChainXY API Key
     scrape_update_list:list - Calls the returned list of Scapes from generate_updates_list
+    journal_file:str - optional, path of a checkpoint journal (see extractionJournal.py). Issued download ids are recorded in it,
+        a re-run checks the already issued downloads again instead of posting them. Links are pre-signed and expire, so they are not
+        journaled: a re-run gets a current link from the status of the download.
     """
     
     check_api_key(cxy_api_key)
@@ -68,17 +72,26 @@ def generate_downloads(cxy_api_key:str, scrape_update_list:list):
     data = {}
     createdScrapeFileURLs = []
     api_download_url = "https://location.chainxy.com/api/ChainScrapes/Download/"
+    run_key = get_run_key('generate_downloads', url_params)
     
 
     # Loops untill the end of the scape ids list and executes the post and get api calls as well as printing/returning the url to the console.
     for item in scrape_update_list:
 
-        # Posts and creates the links on the platform here
-        response = requests.post(url=api_download_url + str(item['Id']), data=json.dumps(data), params=url_params, headers=headers)
-        r_body = json.loads(response.text)
+        if journal_file:
+            scrape_download_id = journal_get(journal_file, run_key, 'download_id', item['Id'])
+        else:
+            scrape_download_id = None
 
-        #Uses the "Id" in r_body for get request for the url link in order to print onto the console
-        scrape_download_id = r_body['Id']
+        if scrape_download_id is None:
+            # Posts and creates the links on the platform here
+            response = requests.post(url=api_download_url + str(item['Id']), data=json.dumps(data), params=url_params, headers=headers)
+            r_body = json.loads(response.text)
+
+            #Uses the "Id" in r_body for get request for the url link in order to print onto the console
+            scrape_download_id = r_body['Id']
+            if journal_file:
+                journal_put(journal_file, run_key, 'download_id', item['Id'], scrape_download_id)
         print("Run Date: " + str(item['RunDate']))
         fileGenerated = False
         createdScrapeFileURL = False
@@ -96,6 +109,9 @@ def generate_downloads(cxy_api_key:str, scrape_update_list:list):
             elif r_body['Status'] == 2:
                 print("File generation failed. Speak to ChainXY for assistance")
                 fileGenerated = True
+                if journal_file:
+                    # forget the failed download, so a re-run posts a new one
+                    journal_put(journal_file, run_key, 'download_id', item['Id'], None)
 
             elif r_body['Status'] == 1:
                 print("File generation completed!")
@@ -116,10 +132,12 @@ def main():
 
     cxy_api_key = ''
     chain_id = 0 
+    # optional - path of a checkpoint journal, re-running resumes an interrupted run
+    journal_file = None
     
     # Calls variables and Executes Functions here
     updates_record_list = generate_updates_list(cxy_api_key, chain_id)
-    scrape_download_urls = generate_downloads(cxy_api_key, updates_record_list)
+    scrape_download_urls = generate_downloads(cxy_api_key, updates_record_list, journal_file)
 
 
 if __name__ == '__main__':
@@ -3,6 +3,8 @@
 import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from extractionJournal import get_run_key, journal_clear, journal_get, journal_get_all, journal_put
 
 def check_api_key(cxy_api_key):
     url = 'https://location.chainxy.com/api/Users/Me'
@@ -13,7 +15,7 @@ def check_api_key(cxy_api_key):
     if response.status_code == 401:
         raise ValueError("Bad ChainXY API key provided, double-check the provided value!")
 
-def list_locations_by_last_scrape_date(cxy_api_key:str, ChainIds:list, LastUpdateDate:str, north:float=90, east:float=180, south:float=-90, west:float=-180, limit:int=100):
+def list_locations_by_last_scrape_date(cxy_api_key:str, ChainIds:list, LastUpdateDate:str, north:float=90, east:float=180, south:float=-90, west:float=-180, limit:int=100, journal_file:str=None):
     '''
     Generates a file based on the provided input parameters. Returns a URL to the report.
     cxy_api_key:str - ChainXY API Key,
@@ -24,6 +26,9 @@ def list_locations_by_last_scrape_date(cxy_api_key:str, ChainIds:list, LastUpdat
         You can bypass this record limit by passing limit=-1. 
         We ask that you be reasonable with your records requests. 
         We reserve the right to suspend your API access if your usage is deemed unreasonable.
+    journal_file:str - optional, path of a checkpoint journal (see extractionJournal.py). Completed pages are recorded in it,
+        and a re-run of an interrupted run with the same parameters only requests the pages that are missing. The entries of the run
+        are deleted once it completes, so a later run requests fresh data.
     '''
 
     check_api_key(cxy_api_key)
@@ -31,12 +36,25 @@ def list_locations_by_last_scrape_date(cxy_api_key:str, ChainIds:list, LastUpdat
             'x-Application': 'Python API Call',
             'content-type': 'application/json'}
 
-    pageUrl = f"https://location.chainxy.com/api/Locations?chainIds={ChainIds}&Limit={limit}&Page={i}&OrderBy=Id&North={north}&East={east}&South={south}&West={west}&LastUpdate=>{LastUpdateDate}"
+    run_key = get_run_key('list_locations_by_last_scrape_date', {'ChainIds': ChainIds, 'LastUpdateDate': LastUpdateDate, 'north': north, 'east': east, 'south': south, 'west': west, 'limit': limit})
+    completed_pages = journal_get_all(journal_file, run_key, 'page') if journal_file else {}
+
+    pageUrl = f"https://location.chainxy.com/api/Locations?chainIds={ChainIds}&Limit={limit}&Page=0&OrderBy=Id&North={north}&East={east}&South={south}&West={west}&LastUpdate=>{LastUpdateDate}"
     records = []
-    pages = getPageNum(pageUrl, headers)
-    
+    # a resumed run keeps the page count of the first run, so the page boundaries stay the same
+    pages = journal_get(journal_file, run_key, 'pages', 'count') if journal_file else None
+    if pages is None:
+        pages = getPageNum(pageUrl, headers)
+        if journal_file:
+            journal_put(journal_file, run_key, 'pages', 'count', pages)
+    elif completed_pages:
+        print(f"Resuming from journal, {len(completed_pages)}/{pages} pages already completed")
 
     for i in range(1, pages+1):
+        if str(i) in completed_pages:
+            records.extend(completed_pages[str(i)])
+            continue
+
         apiUrl = f"https://location.chainxy.com/api/Locations?chainIds={ChainIds}&Limit={limit}&Page={i}&OrderBy=Id&North={north}&East={east}&South={south}&West={west}&LastUpdate=>{LastUpdateDate}"
         r = requests.get(url=apiUrl, headers=headers)
     
@@ -48,9 +66,13 @@ def list_locations_by_last_scrape_date(cxy_api_key:str, ChainIds:list, LastUpdat
                 print('Request complete!')
                 generated_file = True
                 records.extend(r_body['Records'])
+                if journal_file:
+                    journal_put(journal_file, run_key, 'page', i, r_body['Records'])
             else:
                 print('There are no records for your request. Speak to ChainXY for assistance.')
 
+    if journal_file:
+        journal_clear(journal_file, run_key)
     return records
 
 def getPageNum(url, headers):
@@ -59,6 +81,137 @@ def getPageNum(url, headers):
     r_body = json.loads(r.text)
     return r_body['Pages']
 
+def get_id_range(params:dict, headers:dict):
+    '''Returns the lowest and highest location Id matching the request, or (None, None) if there are no matches'''
+    apiUrl = "https://location.chainxy.com/api/Locations"
+    ids = []
+    for order in ['Id', '-Id']:
+        r = requests.get(url=apiUrl, params={**params, 'Limit': 1, 'Page': 0, 'OrderBy': order}, headers=headers)
+        r.raise_for_status()
+        r_body = json.loads(r.text)
+        if not r_body['Records']:
+            return None, None
+        ids.append(r_body['Records'][0]['Id'])
+    return ids[0], ids[1]
+
+def split_id_range(min_id:int, max_id:int, shards:int):
+    '''Splits the inclusive range [min_id, max_id] into at most `shards` disjoint inclusive intervals'''
+    shards = max(1, min(shards, max_id - min_id + 1))
+    size = (max_id - min_id + 1) / shards
+    bounds = [min_id + round(size * i) for i in range(shards)] + [max_id + 1]
+    return [(bounds[i], bounds[i+1] - 1) for i in range(shards)]
+
+def scan_id_shard(params:dict, headers:dict, shard:tuple, limit:int=5000, last_seen:int=None, on_page=None):
+    '''
+    Returns all locations with an Id inside the inclusive interval `shard`, ordered by Id.
+    Every request asks for the next `limit` records with an Id greater than the last one received (keyset pagination),
+    so the cost of a request does not grow with the number of records already read, and a record is never skipped or
+    returned twice when the data changes during the scan.
+    params:dict - query parameters of the api/Locations request (chainIds, bounding box, LastUpdate)
+    headers:dict - request headers, including the api key
+    shard:tuple - (first Id, last Id) of the interval
+    limit:int - number of records requested at a time. The scan continues until an empty page, so a server-side cap on Limit is harmless
+    last_seen:int - optional, resumes the scan after this Id
+    on_page - optional, function called with every page of records as soon as it is received
+    '''
+    apiUrl = "https://location.chainxy.com/api/Locations"
+    first_id, last_id = shard
+    if last_seen is not None:
+        first_id = max(first_id, last_seen + 1)
+
+    records = []
+    while first_id <= last_id:
+        query = {'Id': f'[{first_id},{last_id}]'}
+        r = requests.get(url=apiUrl, params={**params, 'Query': json.dumps(query), 'Limit': limit, 'Page': 0, 'OrderBy': 'Id'}, headers=headers)
+        r.raise_for_status()
+        page = json.loads(r.text)['Records']
+        records.extend(page)
+        if on_page:
+            on_page(page)
+        # a short page is not the end of the shard, the server may return fewer records than the requested limit
+        if not page:
+            break
+        first_id = page[-1]['Id'] + 1
+
+    print(f'Shard [{shard[0]},{shard[1]}] complete: {len(records)} records')
+    return records
+
+def list_locations_by_id_shards(cxy_api_key:str, ChainIds:list, LastUpdateDate:str, north:float=90, east:float=180, south:float=-90, west:float=-180, limit:int=5000, shards:int=8, max_workers:int=8, journal_file:str=None):
+    '''
+    Returns the same records as list_locations_by_last_scrape_date(), ordered by Id, using keyset pagination instead of pages.
+    The Id range of the request is split into disjoint intervals (shards) that are scanned in parallel.
+    cxy_api_key:str - ChainXY API Key,
+    ChainIds:list - list of Chain ids in int form (e.g. [5111, 1])
+    LastUpdateDate:str -  Starting point of the updates in YYYY-MM-DD
+    north, east, south, west:float - points of polygon search area
+    limit:int - number of records requested at a time. We recommend requesting 5000 records max at a time.
+    shards:int - number of Id intervals the request is split into
+    max_workers:int - number of shards scanned at the same time
+    journal_file:str - optional, path of a checkpoint journal (see extractionJournal.py). The Id range, every page received and
+        completed shards are recorded in it, and a re-run of an interrupted run with the same parameters continues each shard after its last recorded Id.
+        The entries of the run are deleted once it completes, so a later run requests fresh data.
+    '''
+
+    check_api_key(cxy_api_key)
+    headers = {'x-apikey': cxy_api_key,
+            'x-Application': 'Python API Call',
+            'content-type': 'application/json'}
+    params = {
+        'chainIds': ChainIds,
+        'North': north,
+        'East': east,
+        'South': south,
+        'West': west,
+        'LastUpdate': f'>{LastUpdateDate}'
+        }
+
+    run_key = get_run_key('list_locations_by_id_shards', {**params, 'limit': limit, 'shards': shards})
+
+    # a resumed run reuses the Id range of the first run, so the shards stay the same
+    id_range = journal_get(journal_file, run_key, 'range', 'ids') if journal_file else None
+    if id_range is None:
+        id_range = get_id_range(params, headers)
+        if journal_file:
+            journal_put(journal_file, run_key, 'range', 'ids', id_range)
+    min_id, max_id = id_range
+    if min_id is None:
+        print('There are no records for your request.')
+        if journal_file:
+            journal_clear(journal_file, run_key)
+        return []
+
+    id_shards = split_id_range(min_id, max_id, shards)
+    print(f'Scanning Ids {min_id} to {max_id} in {len(id_shards)} shards...')
+
+    def scan(shard):
+        if not journal_file:
+            return scan_id_shard(params, headers, shard, limit)
+
+        shard_name = f'{shard[0]}-{shard[1]}'
+        journaled = []
+        for page in journal_get_all(journal_file, run_key, f'shard {shard_name}').values():
+            journaled.extend(page)
+        journaled.sort(key=lambda record: record['Id'])
+        if journal_get(journal_file, run_key, 'shard_done', shard_name):
+            return journaled
+
+        def on_page(page):
+            if page:
+                journal_put(journal_file, run_key, f'shard {shard_name}', page[0]['Id'], page)
+
+        last_seen = journaled[-1]['Id'] if journaled else None
+        records = journaled + scan_id_shard(params, headers, shard, limit, last_seen, on_page)
+        journal_put(journal_file, run_key, 'shard_done', shard_name, True)
+        return records
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(scan, id_shards)
+        records = [record for shard_records in results for record in shard_records]
+
+    if journal_file:
+        journal_clear(journal_file, run_key)
+    return records
+
 def download_file(input:dict, filename:str):
     """
     Downloads a file in the specified format based on the provided 
@@ -92,7 +245,12 @@ def main():
     south = -90
     west = -180
     
-    raw = list_locations_by_last_scrape_date(cxy_api_key=cxy_api_key, ChainIds=ChainIds, LastUpdateDate=LastUpdateDate, limit=limit)
+    # optional - path of a checkpoint journal, re-running with the same inputs resumes an interrupted run
+    journal_file = None
+
+    raw = list_locations_by_last_scrape_date(cxy_api_key=cxy_api_key, ChainIds=ChainIds, LastUpdateDate=LastUpdateDate, limit=limit, journal_file=journal_file)
+    # for large requests, the Id-sharded scan is faster and consistent while the data changes:
+    # raw = list_locations_by_id_shards(cxy_api_key=cxy_api_key, ChainIds=ChainIds, LastUpdateDate=LastUpdateDate, limit=5000, shards=8, journal_file=journal_file)
     download_file(raw, 'filename.csv')
 
 if __name__ == '__main__':
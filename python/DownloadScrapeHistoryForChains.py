@@ -0,0 +1,374 @@
+# this script sample downloads the complete scrape history for a list of chains.
+# Chains are harvested in parallel, and the progress of each chain is recorded in a file so that
+# re-running the script only downloads scrapes that were not harvested before.
+import requests
+import json
+import os
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from extractionJournal import get_run_key, journal_get, journal_put
+from zipStream import save_download
+
+
+def check_api_key(cxy_api_key):
+    url = "https://location.chainxy.com/api/Users/Me"
+    headers = {
+        "x-apikey": cxy_api_key,
+        "x-Application": "Python API Call",
+        "content-type": "application/json",
+    }
+    response = requests.get(url, headers=headers)
+    if response.status_code == 401:
+        raise ValueError(
+            "Bad ChainXY API key provided, double-check the provided value!"
+        )
+
+
+def list_chain_scrapes(
+    cxy_api_key: str,
+    chain_id: int,
+    run_date_after: str = "",
+    run_date_before: str = "",
+    limit: int = 1000,
+):
+    """
+    Returns all scrapes of a chain, paging through the ChainScrapes endpoint until the last page.
+    cxy_api_key:str - ChainXY API Key
+    chain_id:int - ID of the chain for which the scrapes will be returned
+    run_date_after:str - optional, only return scrapes run on or after this date (YYYY-MM-DD)
+    run_date_before:str - optional, only return scrapes run on or before this date (YYYY-MM-DD)
+    limit:int - number of records requested per page
+    """
+    headers = {
+        "x-apikey": cxy_api_key,
+        "x-Application": "Python API Call",
+        "content-type": "application/json",
+    }
+    api_url = "https://location.chainxy.com/api/ChainScrapes"
+
+    # the RunDate window is applied on the server, so only the scrapes inside it are transferred
+    query = {"ChainId": chain_id}
+    if run_date_after and run_date_before:
+        query["RunDate"] = f"[{run_date_after},{run_date_before}]"
+    elif run_date_after:
+        query["RunDate"] = f">{run_date_after}"
+    elif run_date_before:
+        query["RunDate"] = f"<{run_date_before}"
+
+    records = []
+    page = 0
+    pages = 1
+    while page < pages:
+        params = {
+            "Fields": "Id,RunDate",
+            "Query": json.dumps(query, separators=(",", ":")),
+            "OrderBy": "RunDate",
+            "Limit": limit,
+            "Page": page,
+        }
+        response = requests.get(url=api_url, params=params, headers=headers)
+        response.raise_for_status()
+        r_body = response.json()
+        records.extend(r_body["Records"])
+        pages = r_body.get("Pages", 0)
+        page += 1
+
+    return records
+
+
+def download_scrape(
+    cxy_api_key: str,
+    scrape_id: int,
+    output_file: str,
+    check_frequency: float = 5,
+    journal_file: str = None,
+):
+    """
+    Generates a download of a single scrape, waits for it to finish and saves it to output_file.
+    Returns the path of the saved file, or None if the file generation failed.
+    cxy_api_key:str - ChainXY API Key
+    scrape_id:int - ID of the scrape to download
+    output_file:str - path of the downloaded csv file
+    check_frequency:float - delay (in seconds) between successive checks of the status of the download
+    journal_file:str - optional, path of a checkpoint journal (see extractionJournal.py). A scrape whose file is recorded is not downloaded again,
+        and a download issued by an interrupted run is reused instead of posting a new one.
+    """
+    headers = {
+        "x-apikey": cxy_api_key,
+        "x-Application": "Python API Call",
+        "content-type": "application/json",
+    }
+    # the scrape is transferred compressed and decompressed while it is downloaded
+    url_params = {
+        "format": "ZIP_CSV",
+        "splitLayers": "false",
+    }
+    run_key = get_run_key("download_scrape", url_params)
+
+    scrape_download_id = None
+    if journal_file:
+        finished_file = journal_get(journal_file, run_key, "file", scrape_id)
+        if finished_file and os.path.exists(finished_file):
+            return finished_file
+        scrape_download_id = journal_get(
+            journal_file, run_key, "download_id", scrape_id
+        )
+
+    if scrape_download_id is None:
+        response = requests.post(
+            url=f"https://location.chainxy.com/api/ChainScrapes/Download/{scrape_id}",
+            data=json.dumps({}),
+            params=url_params,
+            headers=headers,
+        )
+        response.raise_for_status()
+        scrape_download_id = response.json()["Id"]
+        if journal_file:
+            journal_put(
+                journal_file, run_key, "download_id", scrape_id, scrape_download_id
+            )
+
+    while True:
+        response = requests.get(
+            url=f"https://location.chainxy.com/api/Downloads/{scrape_download_id}",
+            headers=headers,
+        )
+        r_body = response.json()["Record"]
+
+        if r_body["Status"] == 0:
+            time.sleep(check_frequency)
+
+        elif r_body["Status"] == 2:
+            print(
+                f"File generation failed for Scrape ID: {scrape_id}. Speak to ChainXY for assistance"
+            )
+            if journal_file:
+                # forget the failed download, so a re-run posts a new one
+                journal_put(journal_file, run_key, "download_id", scrape_id, None)
+            return None
+
+        elif r_body["Status"] == 1:
+            break
+
+    # write to a temporary name first, so an interrupted download never looks finished
+    save_download(r_body["Link"], output_file + ".part")
+    os.replace(output_file + ".part", output_file)
+    if journal_file:
+        journal_put(journal_file, run_key, "file", scrape_id, output_file)
+
+    return output_file
+
+
+def load_progress(progress_file: str):
+    """
+    Reads the progress file and returns a dict of chain_id -> list of progress entries.
+    Each line of the progress file is a json object written by record_progress().
+    """
+    progress = {}
+    if not os.path.exists(progress_file):
+        return progress
+
+    with open(progress_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a partially written last line, left behind by an interrupted run
+                continue
+            progress.setdefault(entry["ChainId"], []).append(entry)
+    return progress
+
+
+def record_progress(progress_file: str, entry: dict, lock: threading.Lock):
+    """
+    Appends a progress entry for a harvested chain to the progress file.
+    """
+    with lock:
+        with open(progress_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def harvest_chain(
+    cxy_api_key: str,
+    chain_id: int,
+    output_dir: str,
+    chain_progress: list,
+    run_date_after: str = "",
+    run_date_before: str = "",
+    check_frequency: float = 5,
+    journal_file: str = None,
+):
+    """
+    Downloads every scrape of a chain that was not harvested before and returns a progress entry for the chain.
+    cxy_api_key:str - ChainXY API Key
+    chain_id:int - ID of the chain to harvest
+    output_dir:str - directory in which a sub-directory per chain is created for the scrape files
+    chain_progress:list - previous progress entries of the chain, as returned by load_progress()
+    run_date_after:str - optional, start of the RunDate window (YYYY-MM-DD)
+    run_date_before:str - optional, end of the RunDate window (YYYY-MM-DD)
+    check_frequency:float - delay (in seconds) between successive checks of the status of a download
+    journal_file:str - optional, path of the checkpoint journal passed to download_scrape()
+    """
+    harvested_ids = set()
+    last_run_date = ""
+    for entry in chain_progress:
+        harvested_ids.update(entry["ScrapeIds"])
+        last_run_date = max(last_run_date, entry["LastRunDate"] or "")
+
+    # only ask the server for scrapes newer than the last harvest of this chain
+    if last_run_date:
+        run_date_after = max(run_date_after, last_run_date[:10])
+
+    scrapes = list_chain_scrapes(
+        cxy_api_key, chain_id, run_date_after, run_date_before
+    )
+    # the RunDate window is inclusive, so drop scrapes harvested on the boundary date
+    scrapes = [scrape for scrape in scrapes if scrape["Id"] not in harvested_ids]
+
+    chain_dir = os.path.join(output_dir, str(chain_id))
+    os.makedirs(chain_dir, exist_ok=True)
+
+    scrape_ids = []
+    files = []
+    failed_ids = []
+    for scrape in scrapes:
+        output_file = os.path.join(chain_dir, f"{scrape['Id']}.csv")
+        if download_scrape(
+            cxy_api_key, scrape["Id"], output_file, check_frequency, journal_file
+        ):
+            scrape_ids.append(scrape["Id"])
+            files.append(output_file)
+            # scrapes are ordered by RunDate: LastRunDate never moves past a failed scrape, so the next run requests it again
+            if not failed_ids:
+                last_run_date = max(last_run_date, scrape["RunDate"])
+        else:
+            failed_ids.append(scrape["Id"])
+
+    print(
+        f"Chain {chain_id}: downloaded {len(files)} of {len(scrapes)} new scrapes"
+        + (f", {len(failed_ids)} failed and will be retried" if failed_ids else "")
+    )
+    return {
+        "ChainId": chain_id,
+        "RunDateAfter": run_date_after,
+        "RunDateBefore": run_date_before,
+        "LastRunDate": last_run_date,
+        "ScrapeIds": scrape_ids,
+        "FailedScrapeIds": failed_ids,
+        "Files": files,
+    }
+
+
+def harvest_scrape_history(
+    cxy_api_key: str,
+    chain_ids: list,
+    output_dir: str,
+    progress_file: str = "",
+    run_date_after: str = "",
+    run_date_before: str = "",
+    max_workers: int = 8,
+    check_frequency: float = 5,
+    journal_file: str = "",
+):
+    """
+    Downloads the scrape history of many chains in parallel and returns the progress entries of the harvested chains.
+    Chains that already have a progress entry without failed scrapes for the same run_date_before are skipped, so an interrupted
+    harvest can be re-run with the same parameters to finish the remaining chains and retry the failed scrapes.
+    cxy_api_key:str - ChainXY API Key
+    chain_ids:list - list of Chain ids:int
+    output_dir:str - directory where the scrape files are saved, one sub-directory per chain
+    progress_file:str - optional, path of the progress file. Defaults to progress.jsonl in output_dir
+    run_date_after:str - optional, start of the RunDate window (YYYY-MM-DD)
+    run_date_before:str - optional, end of the RunDate window (YYYY-MM-DD), defaults to today
+    max_workers:int - number of chains harvested at the same time
+    check_frequency:float - delay (in seconds) between successive checks of the status of a download
+    journal_file:str - optional, path of the checkpoint journal recording the downloads of the scrapes of unfinished chains.
+        Defaults to journal.sqlite in output_dir
+    """
+    check_api_key(cxy_api_key)
+    run_date_before = run_date_before or datetime.utcnow().strftime("%Y-%m-%d")
+    os.makedirs(output_dir, exist_ok=True)
+    progress_file = progress_file or os.path.join(output_dir, "progress.jsonl")
+    journal_file = journal_file or os.path.join(output_dir, "journal.sqlite")
+    progress = load_progress(progress_file)
+    lock = threading.Lock()
+
+    pending = []
+    for chain_id in chain_ids:
+        chain_progress = progress.get(chain_id, [])
+        # a chain with failed scrapes is not complete, it is harvested again to retry them
+        if any(
+            entry["RunDateBefore"] == run_date_before
+            and not entry.get("FailedScrapeIds")
+            for entry in chain_progress
+        ):
+            continue
+        pending.append((chain_id, chain_progress))
+    print(
+        f"Harvesting {len(pending)} chains ({len(chain_ids) - len(pending)} already completed)..."
+    )
+
+    harvested = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                harvest_chain,
+                cxy_api_key,
+                chain_id,
+                output_dir,
+                chain_progress,
+                run_date_after,
+                run_date_before,
+                check_frequency,
+                journal_file,
+            ): chain_id
+            for chain_id, chain_progress in pending
+        }
+        for future in as_completed(futures):
+            chain_id = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                # the chain has no progress entry, so it is retried on the next run
+                print(f"Chain {chain_id} failed: {e}")
+                continue
+            record_progress(progress_file, entry, lock)
+            harvested.append(entry)
+
+    print(f"Finished harvesting {len(harvested)} of {len(pending)} chains.")
+    return harvested
+
+
+def main():
+    # FILL THESE
+    # your chainxy api key
+    cxy_api_key = ""
+    # Chain Ids as list of int
+    chain_ids = []
+    # directory where the scrape files are saved
+    output_dir = ""
+    # optional - RunDate window in the format of YYYY-MM-DD. Leave run_date_before empty to harvest up to today.
+    run_date_after = ""
+    run_date_before = ""
+    # number of chains harvested at the same time
+    max_workers = 8
+
+    harvest_scrape_history(
+        cxy_api_key,
+        chain_ids,
+        output_dir,
+        run_date_after=run_date_after,
+        run_date_before=run_date_before,
+        max_workers=max_workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
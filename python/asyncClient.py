@@ -0,0 +1,681 @@
+# asyncio client for the ChainXY API. It covers the same endpoints as the other samples, but all requests, download status checks and
+# file downloads are coroutines, so a single process can drive hundreds of collection generations and page requests at the same time
+# without a thread per request.
+# Every function taking a cxy_api_key also accepts an ApiKeyPool, which spreads the requests over several API keys.
+# requires an installation of the aiohttp package for your python environment
+import aiohttp
+import asyncio
+import json
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from zipStream import LOCAL_FILE_HEADER, ZipStreamDecoder
+
+API_URL = "https://location.chainxy.com/api"
+
+
+def create_session(max_connections: int = 100):
+    """
+    Returns an aiohttp session to pass to the functions of this module. Use it as an async context manager so it gets closed.
+    max_connections:int - max. number of simultaneous connections of the session
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=max_connections),
+        timeout=aiohttp.ClientTimeout(total=None, sock_read=300),
+    )
+
+
+class ApiKeyPool:
+    """
+    A pool of ChainXY API keys, each with its own budget of concurrent requests and requests per second.
+    Pass the pool instead of a single api key to spread the work over all the keys: paginated requests go to the least busy key,
+    and every download or report is submitted and checked with one key. A key rejected with a 401 is removed from the rotation.
+    keys:list - list of api keys, or of dicts {"key": ..., "max_concurrency": ..., "max_requests_per_second": ...} to give a key its own limits
+    max_concurrency:int - default max. number of simultaneous requests per key
+    max_requests_per_second:float - default max. request rate per key, None for no limit
+    """
+
+    def __init__(
+        self,
+        keys: list,
+        max_concurrency: int = 4,
+        max_requests_per_second: float = None,
+    ):
+        if not keys:
+            raise ValueError("The api key pool needs at least one api key.")
+        self.keys = {}
+        for key in keys:
+            if isinstance(key, str):
+                key = {"key": key}
+            concurrency = key.get("max_concurrency", max_concurrency)
+            rate = key.get("max_requests_per_second", max_requests_per_second)
+            self.keys[key["key"]] = {
+                "max_concurrency": concurrency,
+                "semaphore": asyncio.Semaphore(concurrency),
+                "interval": 1 / rate if rate else 0,
+                "next_request": 0.0,
+                "healthy": True,
+                # requests in flight or waiting for a slot, plus downloads pinned to the key
+                "load": 0,
+            }
+
+    def healthy_keys(self):
+        return [key for key, state in self.keys.items() if state["healthy"]]
+
+    def choose_key(self):
+        """
+        Returns the healthy key with the lowest load relative to its concurrency budget.
+        """
+        keys = self.healthy_keys()
+        if not keys:
+            raise ValueError(
+                "Bad ChainXY API keys provided, no valid key is left in the pool!"
+            )
+        return min(
+            keys,
+            key=lambda key: self.keys[key]["load"] / self.keys[key]["max_concurrency"],
+        )
+
+    def mark_unhealthy(self, key: str):
+        if self.keys[key]["healthy"]:
+            print(
+                f"Removing api key ...{key[-4:]} from the pool, it was rejected with a 401."
+            )
+        self.keys[key]["healthy"] = False
+
+    def delay(self, key: str, seconds: float):
+        """
+        Postpones the next request with a key, e.g. after it was rate limited by the server.
+        """
+        state = self.keys[key]
+        now = asyncio.get_running_loop().time()
+        state["next_request"] = max(state["next_request"], now + seconds)
+
+    @asynccontextmanager
+    async def acquire(self, key: str):
+        """
+        Waits for a free request slot of the key and for its rate limit.
+        """
+        state = self.keys[key]
+        state["load"] += 1
+        try:
+            async with state["semaphore"]:
+                loop = asyncio.get_running_loop()
+                start = max(loop.time(), state["next_request"])
+                state["next_request"] = start + state["interval"]
+                await asyncio.sleep(start - loop.time())
+                yield key
+        finally:
+            state["load"] -= 1
+
+    async def check_keys(self, session: aiohttp.ClientSession):
+        """
+        Validates every key of the pool and removes the invalid ones from the rotation. Returns the valid keys.
+        """
+
+        async def check(key):
+            try:
+                async with self.acquire(key):
+                    status, _ = await send_request(session, key, "Users/Me")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # a rate limit, a server or a network error says nothing about the key, it stays in the rotation
+                if getattr(e, "status", None) == 429:
+                    self.delay(key, get_retry_after(e.headers))
+                print(f"Could not check api key ...{key[-4:]}, keeping it: {e!r}")
+                return
+            if status == 401:
+                self.mark_unhealthy(key)
+
+        await asyncio.gather(*(check(key) for key in self.keys))
+        if not self.healthy_keys():
+            self.choose_key()  # raises
+        return self.healthy_keys()
+
+
+# a key of a pool that a multi-request operation (a download and its status checks) is bound to
+PinnedKey = namedtuple("PinnedKey", ["pool", "key"])
+
+
+@asynccontextmanager
+async def pin_key(cxy_api_key):
+    """
+    Binds an operation to a single key of a pool, because a download can only be checked with the key that submitted it.
+    A plain api key is used as is.
+    """
+    if not isinstance(cxy_api_key, ApiKeyPool):
+        yield cxy_api_key
+        return
+    key = cxy_api_key.choose_key()
+    state = cxy_api_key.keys[key]
+    state["load"] += 1
+    try:
+        yield PinnedKey(cxy_api_key, key)
+    finally:
+        state["load"] -= 1
+
+
+def get_retry_after(headers, default: float = 5):
+    """
+    Returns the number of seconds to wait from the Retry-After header of a response, which is either a number of seconds
+    or an HTTP date. Returns default if the header is missing or can't be parsed.
+    """
+    retry_after = (headers or {}).get("Retry-After")
+    if not retry_after:
+        return default
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return default
+    if retry_date is None:
+        return default
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+
+async def send_request(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    path: str,
+    method: str = "GET",
+    params: dict = None,
+    data=None,
+):
+    """
+    Sends a single request with a single api key. Returns the status and the parsed json response (None for a 401).
+    """
+    headers = {
+        "x-apikey": cxy_api_key,
+        "x-Application": "Python API Call",
+        "content-type": "application/json",
+    }
+    async with session.request(
+        method,
+        f"{API_URL}/{path}",
+        params=params,
+        data=json.dumps(data) if data is not None else None,
+        headers=headers,
+    ) as r:
+        if r.status == 401:
+            return r.status, None
+        r.raise_for_status()
+        return r.status, await r.json(content_type=None)
+
+
+async def request_api(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    path: str,
+    method: str = "GET",
+    params: dict = None,
+    data=None,
+):
+    """
+    Makes a request to the ChainXY API and returns the parsed json response.
+    cxy_api_key - ChainXY API Key, an ApiKeyPool, or a key pinned with pin_key()
+    path:str - path of the endpoint after /api/, e.g. 'Chains' or 'Downloads/123'
+    data - optional json-serializable request body
+    """
+    if isinstance(cxy_api_key, ApiKeyPool):
+        pool, pinned = cxy_api_key, None
+    elif isinstance(cxy_api_key, PinnedKey):
+        pool, pinned = cxy_api_key.pool, cxy_api_key.key
+    else:
+        status, r_body = await send_request(
+            session, cxy_api_key, path, method, params, data
+        )
+        if status == 401:
+            raise ValueError(
+                "Bad ChainXY API key provided, double-check the provided value!"
+            )
+        return r_body
+
+    while True:
+        key = pinned or pool.choose_key()
+        if not pool.keys[key]["healthy"]:
+            raise ValueError(
+                "Bad ChainXY API key provided, double-check the provided value!"
+            )
+        async with pool.acquire(key):
+            try:
+                status, r_body = await send_request(
+                    session, key, path, method, params, data
+                )
+            except aiohttp.ClientResponseError as e:
+                if e.status != 429:
+                    raise
+                # rate limited by the server: pause the key and retry
+                pool.delay(key, get_retry_after(e.headers))
+                continue
+        if status != 401:
+            return r_body
+        # a pinned request can't move to another key, it fails at the next iteration
+        pool.mark_unhealthy(key)
+
+
+async def check_api_key(session: aiohttp.ClientSession, cxy_api_key):
+    """
+    Validates the ChainXY API key, returns the current user. For an ApiKeyPool, all the keys are checked.
+    """
+    if isinstance(cxy_api_key, ApiKeyPool):
+        return await cxy_api_key.check_keys(session)
+    return await request_api(session, cxy_api_key, "Users/Me")
+
+
+def build_query_params(
+    query=None, fields: str = None, order_by: str = None, params: dict = None
+):
+    """
+    Returns the query parameters of a list request, see the Query Parameters section of the README.
+    """
+    query_params = dict(params or {})
+    if query is not None:
+        query_params["Query"] = json.dumps(query, separators=(",", ":"))
+    if fields:
+        query_params["Fields"] = fields
+    if order_by:
+        query_params["OrderBy"] = order_by
+    return query_params
+
+
+async def get_records(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    resource: str,
+    query=None,
+    fields: str = None,
+    order_by: str = None,
+    limit: int = 100,
+    page: int = 0,
+    params: dict = None,
+):
+    """
+    Returns a single page of a resource, e.g. 'Chains', 'Locations' or 'ChainScrapes'. The response includes 'Records' and 'Pages'.
+    """
+    query_params = build_query_params(query, fields, order_by, params)
+    query_params.update({"Limit": limit, "Page": page})
+    return await request_api(session, cxy_api_key, resource, params=query_params)
+
+
+async def get_all_records(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    resource: str,
+    query=None,
+    fields: str = None,
+    order_by: str = "Id",
+    limit: int = 1000,
+    params: dict = None,
+    max_concurrency: int = 8,
+):
+    """
+    Returns all the records of a resource. The first page gives the number of pages, the remaining pages are requested concurrently.
+    max_concurrency:int - max. number of pages requested at the same time
+    """
+    first = await get_records(
+        session, cxy_api_key, resource, query, fields, order_by, limit, 0, params
+    )
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def get_page(page):
+        async with semaphore:
+            r_body = await get_records(
+                session,
+                cxy_api_key,
+                resource,
+                query,
+                fields,
+                order_by,
+                limit,
+                page,
+                params,
+            )
+            return r_body["Records"]
+
+    pages = await asyncio.gather(
+        *(get_page(page) for page in range(1, first.get("Pages", 0)))
+    )
+    records = list(first["Records"])
+    for page_records in pages:
+        records.extend(page_records)
+    return records
+
+
+async def list_chains(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    query=None,
+    fields: str = "Id,Name,LastScrapeDate",
+):
+    """
+    Returns the chains matching a query, e.g. {"Name": "Walmart"} or {"Id": [5227, 4713]}.
+    """
+    return await get_all_records(session, cxy_api_key, "Chains", query, fields)
+
+
+async def list_locations(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    chain_ids: list,
+    last_update_date: str = None,
+    north: float = 90,
+    east: float = 180,
+    south: float = -90,
+    west: float = -180,
+    limit: int = 5000,
+):
+    """
+    Returns the locations of the chains inside the bounding box, optionally only the ones updated after last_update_date (YYYY-MM-DD).
+    """
+    params = {
+        "chainIds": ",".join(str(chain_id) for chain_id in chain_ids),
+        "North": north,
+        "East": east,
+        "South": south,
+        "West": west,
+    }
+    if last_update_date:
+        params["LastUpdate"] = f">{last_update_date}"
+    return await get_all_records(
+        session, cxy_api_key, "Locations", limit=limit, params=params
+    )
+
+
+async def list_chain_scrapes(
+    session: aiohttp.ClientSession, cxy_api_key, chain_id: int
+):
+    """
+    Returns the Id and RunDate of all the scrapes of a chain.
+    """
+    return await get_all_records(
+        session,
+        cxy_api_key,
+        "ChainScrapes",
+        {"ChainId": chain_id},
+        "Id,RunDate",
+        "RunDate",
+    )
+
+
+async def generate_collection(
+    session: aiohttp.ClientSession, cxy_api_key, collection_params: dict
+):
+    """
+    Generates a ChainXY collection, see generate_collection in createCollectionAndDownload.py for the collection definition.
+    Returns the collection id.
+    """
+    collection_params = dict(collection_params)
+    chains = collection_params.get("Chains")
+    chains_query = collection_params.get("ChainsQuery")
+    admin_levels = collection_params.get("AdminLevels")
+
+    if admin_levels:
+        if not all(isinstance(id, int) for id in admin_levels):
+            raise ValueError("Admin Level ids must be integers.")
+        collection_params["AdminLevels"] = [{"Id": id} for id in admin_levels]
+    if chains and chains_query:
+        raise ValueError(
+            f"The list of chains and a chains query can't be both specified at once. Current values: {chains=}, {chains_query=}"
+        )
+    if chains_query:
+        collection_params["ChainsQuery"] = json.dumps(
+            chains_query, separators=(",", ":")
+        )
+    # i.e. include all chains
+    if not chains and not chains_query:
+        collection_params["ChainsQuery"] = "{}"
+
+    r_body = await request_api(
+        session, cxy_api_key, "ChainLists", "POST", data=collection_params
+    )
+    return r_body["Id"]
+
+
+async def wait_for_download(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    download_id: int,
+    check_frequency: float = 1,
+):
+    """
+    Waits for a download (collection, site list, scrape or report) to finish and returns its link, or None if it failed.
+    cxy_api_key - ChainXY API Key, or the key pinned with pin_key() that submitted the download
+    check_frequency:float - delay (in seconds) between successive checks of the status of the download
+    """
+    while True:
+        r_body = await request_api(session, cxy_api_key, f"Downloads/{download_id}")
+        record = r_body["Record"]
+        if record["Status"] == 0:
+            await asyncio.sleep(check_frequency)
+        elif record["Status"] == 2:
+            print(
+                f"File generation failed for Download Id: {download_id}. Speak to ChainXY for assistance"
+            )
+            return None
+        elif record["Status"] == 1:
+            return record["Link"]
+
+
+async def download_collection(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    collection_id: int,
+    data_date: str = None,
+    split_layers: bool = False,
+    format: str = "ZIP_CSV",
+    check_frequency: float = 1,
+):
+    """
+    Generates a download of a chain collection, waits for it and returns its link.
+    format:str - "ZIP_CSV" (default, a fraction of the size to transfer, see download_file) or "CSV"
+    """
+    params = {"format": format, "splitLayers": "true" if split_layers else "false"}
+    if data_date:
+        params["dataDate"] = data_date
+    async with pin_key(cxy_api_key) as cxy_api_key:
+        r_body = await request_api(
+            session, cxy_api_key, f"ChainLists/Download/{collection_id}", "POST", params
+        )
+        return await wait_for_download(
+            session, cxy_api_key, r_body["Id"], check_frequency
+        )
+
+
+async def download_site_list(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    site_list_id: int,
+    data_date: str = None,
+    check_frequency: float = 1,
+):
+    """
+    Generates a download of a center collection, waits for it and returns its link.
+    """
+    params = {"format": "ZIP_CSV"}
+    if data_date:
+        params["dataDate"] = data_date
+    async with pin_key(cxy_api_key) as cxy_api_key:
+        r_body = await request_api(
+            session, cxy_api_key, f"SiteLists/Download/{site_list_id}", "POST", params
+        )
+        # center collections return a list
+        download_id = r_body[0]["Id"] if isinstance(r_body, list) else r_body["Id"]
+        return await wait_for_download(
+            session, cxy_api_key, download_id, check_frequency
+        )
+
+
+async def download_chain_scrape(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    scrape_id: int,
+    check_frequency: float = 5,
+):
+    """
+    Generates a download of a single scrape (ZIP_CSV, see download_file), waits for it and returns its link.
+    """
+    params = {"format": "ZIP_CSV", "splitLayers": "false"}
+    async with pin_key(cxy_api_key) as cxy_api_key:
+        r_body = await request_api(
+            session,
+            cxy_api_key,
+            f"ChainScrapes/Download/{scrape_id}",
+            "POST",
+            params,
+            {},
+        )
+        return await wait_for_download(
+            session, cxy_api_key, r_body["Id"], check_frequency
+        )
+
+
+async def download_changes_over_time_report(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    collection_id: int,
+    report_params: dict,
+    check_frequency: float = 5,
+):
+    """
+    Generates a Changes Over Time (COT) report, see generateReports.py for its parameters. Returns the report link.
+    """
+    async with pin_key(cxy_api_key) as cxy_api_key:
+        r_body = await request_api(
+            session,
+            cxy_api_key,
+            f"ChainLists/ChangesOverTimeReport/{collection_id}",
+            "POST",
+            {"format": "XLSX"},
+            report_params,
+        )
+        return await wait_for_download(
+            session, cxy_api_key, r_body["Id"], check_frequency
+        )
+
+
+async def download_nearest_report(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    report_params: dict,
+    check_frequency: float = 5,
+):
+    """
+    Generates a Nearest Neighbor (NN) report, see generateReports.py for its parameters. Returns the report link.
+    """
+    async with pin_key(cxy_api_key) as cxy_api_key:
+        r_body = await request_api(
+            session,
+            cxy_api_key,
+            "ChainLists/NearestReport",
+            "POST",
+            {"format": "CSV"},
+            report_params,
+        )
+        return await wait_for_download(
+            session, cxy_api_key, r_body["Id"], check_frequency
+        )
+
+
+async def download_void_analysis_report(
+    session: aiohttp.ClientSession,
+    cxy_api_key,
+    target_collection_id: int,
+    report_params: dict,
+    check_frequency: float = 5,
+):
+    """
+    Generates a Void Analysis (VA) report, see generateReports.py for its parameters. Returns the report link.
+    """
+    async with pin_key(cxy_api_key) as cxy_api_key:
+        r_body = await request_api(
+            session,
+            cxy_api_key,
+            f"ChainLists/VoidAnalysisReport/{target_collection_id}",
+            "POST",
+            {"format": "CSV"},
+            report_params,
+        )
+        return await wait_for_download(
+            session, cxy_api_key, r_body["Id"], check_frequency
+        )
+
+
+async def download_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    output_file: str,
+    chunk_size: int = 65536,
+    decompress: bool = True,
+):
+    """
+    Streams the file at url (a download link) to path output_file. With decompress=True, a ZIP_CSV download is
+    decompressed while it is transferred and output_file is the CSV itself; plain CSV downloads are saved as they are.
+    """
+    if not url:
+        return
+    decoder = None
+    # download links are pre-signed, the api key is not sent with them
+    async with session.get(url) as r:
+        r.raise_for_status()
+        with open(output_file, "wb") as f:
+            first = True
+            async for chunk in r.content.iter_chunked(chunk_size):
+                # only the start of the download tells a zip archive from a plain CSV
+                if first and decompress and chunk.startswith(LOCAL_FILE_HEADER):
+                    decoder = ZipStreamDecoder(single_member=True)
+                first = False
+                if not decoder:
+                    f.write(chunk)
+                    continue
+                for _, piece in decoder.feed(chunk):
+                    f.write(piece)
+    if decoder:
+        decoder.close()
+
+    print(f"Saved file downloaded from:\n{url}\nto: {output_file}")
+    return output_file
+
+
+async def download_collections(
+    cxy_api_key, collection_ids: list, output_dir: str, data_date: str = None
+):
+    """
+    Example: generates the downloads of many collections at the same time and saves them to output_dir.
+    """
+    async with create_session() as session:
+        await check_api_key(session, cxy_api_key)
+
+        async def download(collection_id):
+            link = await download_collection(
+                session, cxy_api_key, collection_id, data_date
+            )
+            return await download_file(
+                session, link, f"{output_dir}/collection_{collection_id}.csv"
+            )
+
+        return await asyncio.gather(
+            *(download(collection_id) for collection_id in collection_ids)
+        )
+
+
+def main():
+    # FILL THESE
+    # your chainxy api key
+    cxy_api_key = ""
+    # optional - to spread the downloads over several api keys, use a pool instead, e.g.
+    # cxy_api_key = ApiKeyPool(["key 1", {"key": "key 2", "max_concurrency": 8}], max_concurrency=4, max_requests_per_second=5)
+    # ids of the collections to download
+    collection_ids = []
+    # directory where the files are saved
+    output_dir = r""
+
+    asyncio.run(download_collections(cxy_api_key, collection_ids, output_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# this script converts a downloaded collection CSV (see download_file in createCollectionAndDownload.py) into a compact columnar store on disk,
+# and reads the store back as memory-mapped numpy arrays.
+# The store only has to be written once; every analysis afterwards maps the columns without parsing any text, and processes
+# mapping the same store share a single page-cached copy of it.
+# requires an installation of the numpy package for your python environment
+import array
+import csv
+import json
+import os
+import sys
+import numpy as np
+
+# default layout of the store, columns missing from the CSV are skipped
+DEFAULT_INT_COLUMNS = ["Id", "ChainId"]
+DEFAULT_FLOAT_COLUMNS = ["Latitude", "Longitude"]
+DEFAULT_DICTIONARY_COLUMNS = [
+    "ChainName",
+    "StoreId",  # the retailer's own store number, often alphanumeric
+    "Category",
+    "PrimaryCategory",
+    "Country",
+    "State",
+    "County",
+    "City",
+    "PostalCode",
+]
+
+INT32_MIN = -(2**31)
+INT32_MAX = 2**31 - 1
+# value stored for an empty int cell, and the code stored for an empty dictionary cell
+MISSING_INT = -1
+# on-disk (little-endian) numpy types of the column types
+COLUMN_DTYPES = {
+    "int32": "<i4",
+    "float32": "<f4",
+    "float64": "<f8",
+    "dictionary": "<i4",
+}
+
+
+def convert_csv_to_columnar(
+    csv_file: str,
+    store_dir: str,
+    int_columns: list = None,
+    float_columns: list = None,
+    dictionary_columns: list = None,
+    float_type: str = "float64",
+    chunk_rows: int = 100000,
+):
+    """
+    Converts a locations CSV into a columnar store and returns the store's metadata.
+    The CSV is read as a stream and the columns are written in chunks, so the whole file never has to fit in memory.
+    csv_file:str - path of the downloaded CSV, or a text file object reading it
+    store_dir:str - directory of the store, one binary file per column plus meta.json
+    int_columns:list - columns stored as int32, empty cells are stored as -1
+    float_columns:list - columns stored as floats, empty cells are stored as NaN
+    dictionary_columns:list - text columns stored as int32 codes into a dictionary of their distinct values, empty cells are stored as -1
+    float_type:str - 'float32' (half the size, ~1m precision for coordinates) or 'float64'
+    chunk_rows:int - number of rows buffered before they are written to the column files
+    """
+    if float_type not in ("float32", "float64"):
+        raise ValueError(
+            f"float_type must be one of ['float32', 'float64'], got {float_type!r}"
+        )
+    int_columns = DEFAULT_INT_COLUMNS if int_columns is None else int_columns
+    float_columns = DEFAULT_FLOAT_COLUMNS if float_columns is None else float_columns
+    dictionary_columns = (
+        DEFAULT_DICTIONARY_COLUMNS if dictionary_columns is None else dictionary_columns
+    )
+    os.makedirs(store_dir, exist_ok=True)
+    meta_file = os.path.join(store_dir, "meta.json")
+    # meta.json is written last, so a store without it is an unfinished conversion
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    # a file object can be passed instead of a path, e.g. zipStream.open_download(url) to convert a download while it is transferred
+    f = (
+        open(csv_file, "r", encoding="utf-8-sig", newline="")
+        if isinstance(csv_file, str)
+        else csv_file
+    )
+    with f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames or []
+
+        # array typecodes: 'i' is a 32 bit int, 'f'/'d' are 32/64 bit floats
+        layout = {}
+        for column in int_columns:
+            if column in header:
+                layout[column] = ("int32", "i")
+        for column in float_columns:
+            if column in header:
+                layout[column] = (float_type, "f" if float_type == "float32" else "d")
+        for column in dictionary_columns:
+            if column in header:
+                layout[column] = ("dictionary", "i")
+
+        dictionaries = {
+            column: {} for column, (kind, _) in layout.items() if kind == "dictionary"
+        }
+        buffers = {
+            column: array.array(typecode) for column, (_, typecode) in layout.items()
+        }
+        outputs = {
+            column: open(os.path.join(store_dir, f"{column}.bin"), "wb")
+            for column in layout
+        }
+
+        record_count = 0
+        try:
+            for row in reader:
+                for column, (kind, _) in layout.items():
+                    value = row[column]
+                    if kind == "int32":
+                        value = int(value) if value not in ("", None) else MISSING_INT
+                        if not INT32_MIN <= value <= INT32_MAX:
+                            raise ValueError(
+                                f"Value {value} of column {column} does not fit in an int32, store the column as a float or dictionary column instead."
+                            )
+                    elif kind == "dictionary":
+                        if value in ("", None):
+                            value = MISSING_INT
+                        else:
+                            value = dictionaries[column].setdefault(
+                                value, len(dictionaries[column])
+                            )
+                    else:
+                        value = (
+                            float(value) if value not in ("", None) else float("nan")
+                        )
+                    buffers[column].append(value)
+
+                record_count += 1
+                if record_count % chunk_rows == 0:
+                    for column, buffer in buffers.items():
+                        write_buffer(buffer, outputs[column])
+            for column, buffer in buffers.items():
+                write_buffer(buffer, outputs[column])
+        finally:
+            for output in outputs.values():
+                output.close()
+
+    columns = {}
+    for column, (kind, _) in layout.items():
+        columns[column] = {"type": kind, "file": f"{column}.bin"}
+        if kind == "dictionary":
+            # the dictionary is stored in code order, so the code of a value is its position in the list
+            dictionary_file = f"{column}.dictionary.json"
+            dictionary_path = os.path.join(store_dir, dictionary_file)
+            with open(dictionary_path, "w", encoding="utf-8") as f:
+                json.dump(list(dictionaries[column]), f, ensure_ascii=False)
+            columns[column]["dictionary"] = dictionary_file
+
+    meta = {"RecordCount": record_count, "Columns": columns}
+    with open(meta_file, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"Converted {record_count} records from {csv_file}\nto: {store_dir}")
+    return meta
+
+
+def write_buffer(buffer: array.array, output):
+    """
+    Writes a column buffer as little-endian values and empties it.
+    """
+    if sys.byteorder == "big":
+        buffer.byteswap()
+    buffer.tofile(output)
+    del buffer[:]
+
+
+def open_location_store(store_dir: str):
+    """
+    Memory-maps the columns of a store written by convert_csv_to_columnar(). No data is copied or parsed,
+    pages are read from the OS page cache as they are accessed.
+    Returns a dict of column -> read-only numpy array, and a dict of column -> list of values for the dictionary columns.
+    store_dir:str - directory of the store
+    """
+    meta_file = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_file):
+        raise ValueError(f"No finished columnar store found in {store_dir}.")
+    with open(meta_file, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    record_count = meta["RecordCount"]
+    columns = {}
+    dictionaries = {}
+    for column, info in meta["Columns"].items():
+        dtype = np.dtype(COLUMN_DTYPES[info["type"]])
+        if record_count == 0:
+            # numpy can't map an empty file
+            columns[column] = np.empty(0, dtype=dtype)
+        else:
+            columns[column] = np.memmap(
+                os.path.join(store_dir, info["file"]),
+                dtype=dtype,
+                mode="r",
+                shape=(record_count,),
+            )
+        if info["type"] == "dictionary":
+            dictionary_path = os.path.join(store_dir, info["dictionary"])
+            with open(dictionary_path, "r", encoding="utf-8") as f:
+                dictionaries[column] = json.load(f)
+
+    return columns, dictionaries
+
+
+def decode_column(codes, dictionary: list):
+    """
+    Returns the values of a dictionary column as a numpy array of strings, empty cells are returned as None.
+    codes - codes of the column, as returned by open_location_store()
+    dictionary:list - dictionary of the column, as returned by open_location_store()
+    """
+    values = np.array(dictionary + [None], dtype=object)
+    # the missing code -1 indexes the trailing None
+    return values[np.asarray(codes)]
+
+
+def main():
+    # FILL THESE
+    # path of a downloaded collection CSV
+    csv_file = r""
+    # directory of the columnar store
+    store_dir = r""
+    # 'float32' halves the size of the coordinates, 'float64' keeps the full precision
+    float_type = "float64"
+
+    convert_csv_to_columnar(csv_file, store_dir, float_type=float_type)
+
+    # any number of processes can then open the store at almost no cost, e.g.
+    columns, dictionaries = open_location_store(store_dir)
+    print(f"Opened columns {list(columns)} of {store_dir}")
+
+
+if __name__ == "__main__":
+    main()
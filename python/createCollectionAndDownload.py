@@ -2,6 +2,7 @@
 import requests
 import json
 import time
+from zipStream import save_download
 
 
 def check_api_key(cxy_api_key):
@@ -72,6 +73,8 @@ def download_collection(
     collection_id: int,
     data_date: str = None,
     check_frequency: float = 1,
+    split_layers: bool = False,
+    format: str = "ZIP_CSV",
 ):
     """
     Downloads a chainxy collection based on the provided collection ID.
@@ -80,6 +83,8 @@ def download_collection(
     collection_id:str - ID of the collection for which a new download will be initiated.
     data_date:str - vintage of the data to be downloaded, e.g., if you want data corresponding to March 1, 2020 you would use "2020-03-01"
     check_frequency:float - delay (in seconds) between successive checks of the status of the download, can be lowered for faster responses for small collections.
+    split_layers:bool - if True, the download is a zip archive with a separate CSV for each chain (see processSplitLayerDownload.py)
+    format:str - "ZIP_CSV" (default, a fraction of the size to transfer, see download_file) or "CSV"
     """
 
     check_api_key(cxy_api_key)
@@ -92,8 +97,8 @@ def download_collection(
     }
 
     url_params = {
-        "format": "CSV",
-        "splitLayers": "false",
+        "format": format,
+        "splitLayers": "true" if split_layers else "false",
     }
     if data_date:
         url_params["dataDate"] = data_date
@@ -140,7 +145,16 @@ def download_collection(
     return createdCollectionFileURL
 
 
-def download_file(url: str, output_file: str):
+def download_file(url: str, output_file: str, decompress: bool = True):
+    """
+    Saves the file at url to output_file. With decompress=True, a ZIP_CSV download is decompressed while it is
+    transferred and output_file is the CSV itself; plain CSV downloads are saved as they are.
+    """
+    if decompress:
+        save_download(url, output_file)
+        print(f"Saved {url}\nto\n{output_file}")
+        return output_file
+
     # NOTE the stream=True parameter below
     with requests.get(url, stream=True) as r:
         r.raise_for_status()
@@ -192,7 +206,7 @@ def main():
     collection_id = generate_collection(cxy_api_key, collection_params)
     collection_download_url = download_collection(
         cxy_api_key, collection_id, data_date, check_frequency
-    )  # can pass the URL directly to pandas to read the csv
+    )  # the download is a ZIP_CSV archive, pass the URL to zipStream.open_download() to read the csv while it is downloaded, e.g. pandas.read_csv(open_download(url))
 
     # output_file = r""
     # download_file(collection_download_url, output_file)
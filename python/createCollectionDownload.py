@@ -3,6 +3,7 @@ import requests
 import json
 import time
 from datetime import datetime
+from zipStream import save_download
 
 def request_api(url:str, cxy_api_key:str, method='GET', params=None, data={}):
     """
@@ -125,7 +126,7 @@ def download_collection(cxy_api_key:str, collection_id:int, collection_type:str,
         check_url = f'https://location.chainxy.com/api/ChainLists/{collection_id}'
         new_download_url = f"https://location.chainxy.com/api/ChainLists/Download/{collection_id}"
         default_url_params = {
-            "format": "CSV",
+            "format": "ZIP_CSV",
             "splitLayers": False,
         }
 
@@ -169,13 +170,20 @@ def download_collection(cxy_api_key:str, collection_id:int, collection_type:str,
     print('----------------------------------------------------------------')
     return collection_download_link
 
-def download_file(url:str, output_file:str):
+def download_file(url:str, output_file:str, decompress:bool=True):
     """
     Downloads the collection file to path output_file.
+    With decompress=True, a zip download of a single CSV is decompressed while it is transferred, so output_file is the CSV itself.
     """
     if not url:
         return 
 
+    if decompress:
+        print(f"Saving file...")
+        save_download(url, output_file)
+        print(f"Saved file downloaded from:\n{url}\nto: {output_file}")
+        return output_file
+
     # NOTE the stream=True parameter below
     print(f"Saving file...")
     with requests.get(url, stream=True) as r:
@@ -209,8 +217,9 @@ def main():
     output_file = r""
     
     if output_file:
+        # chain collections are downloaded compressed and decompressed on the fly, center collections are saved as the zip archive
         output_file += ".csv" if collection_type == 'chain' else ".zip"
-        download_file(collection_download_url, output_file)
+        download_file(collection_download_url, output_file, decompress=collection_type == 'chain')
 
     print(f"Finished request for {collection_type.title()} Collection {collection_id}.")
 
@@ -0,0 +1,81 @@
+# checkpoint journal used by the long-running extraction samples (DownloadLocationsByLastUpdate.py, DownloadAllUpdatesForChain.py,
+# DownloadScrapeHistoryForChains.py). Completed pages/shards, issued download ids and finished files are recorded in a SQLite file as
+# soon as they are done, so a run that is interrupted can be re-run with the same parameters and resumes where it stopped.
+import hashlib
+import json
+import sqlite3
+from contextlib import closing
+
+
+def get_run_key(operation: str, params: dict):
+    """
+    Returns the key identifying a run in the journal. Runs of the same operation with the same parameters share a key,
+    which is how a re-run finds the work done by an interrupted run.
+    operation:str - name of the extraction, e.g. 'list_locations_by_last_scrape_date'
+    params:dict - parameters of the extraction, excluding the api key
+    """
+    serialized = json.dumps(params, sort_keys=True, default=str)
+    return f"{operation}:{hashlib.sha1(serialized.encode('utf-8')).hexdigest()}"
+
+
+def connect(journal_file: str):
+    """
+    Opens the journal, creating it if it does not exist. A new connection is used for every call,
+    so the journal can be shared by worker threads.
+    """
+    conn = sqlite3.connect(journal_file, timeout=60)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries ("
+        "run_key TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT, "
+        "PRIMARY KEY (run_key, kind, key))"
+    )
+    return conn
+
+
+def journal_put(journal_file: str, run_key: str, kind: str, key, value):
+    """
+    Records a completed piece of work. The entry is committed before returning, so it survives a crash right after.
+    kind:str - type of the entry, e.g. 'page', 'download_id' or 'file'
+    key - identifies the piece of work within the run, e.g. a page number or a scrape id
+    value - any json-serializable value
+    """
+    with closing(connect(journal_file)) as conn:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (run_key, kind, key, value) VALUES (?, ?, ?, ?)",
+                (run_key, kind, str(key), json.dumps(value)),
+            )
+
+
+def journal_get(journal_file: str, run_key: str, kind: str, key, default=None):
+    """
+    Returns the value recorded for a piece of work, or default if it was not recorded.
+    """
+    with closing(connect(journal_file)) as conn:
+        row = conn.execute(
+            "SELECT value FROM entries WHERE run_key = ? AND kind = ? AND key = ?",
+            (run_key, kind, str(key)),
+        ).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def journal_get_all(journal_file: str, run_key: str, kind: str):
+    """
+    Returns a dict of key -> value of all the entries of a kind recorded for a run. Keys are returned as strings.
+    """
+    with closing(connect(journal_file)) as conn:
+        rows = conn.execute(
+            "SELECT key, value FROM entries WHERE run_key = ? AND kind = ?",
+            (run_key, kind),
+        ).fetchall()
+    return {key: json.loads(value) for key, value in rows}
+
+
+def journal_clear(journal_file: str, run_key: str):
+    """
+    Deletes all the entries of a run. Called when a run completes, so that only interrupted runs are resumed
+    and a later run with the same parameters requests fresh data.
+    """
+    with closing(connect(journal_file)) as conn:
+        with conn:
+            conn.execute("DELETE FROM entries WHERE run_key = ?", (run_key,))
@@ -0,0 +1,233 @@
+# this script sample splits a multi-region collection into one sub-collection per admin level (country, state, ...),
+# creates and downloads the sub-collections in parallel, and merges them into a single CSV without duplicate locations.
+# The per-region files are kept, so a later run can refresh only the regions that changed and re-merge.
+import copy
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from createCollectionAndDownload import (
+    check_api_key,
+    generate_collection,
+    download_collection,
+    download_file,
+)
+
+
+def split_collection_by_region(collection_params: dict):
+    """
+    Returns a dict of admin level id -> definition of a sub-collection limited to that admin level.
+    collection_params: dict - definition of the collection, see createCollectionAndDownload.py. AdminLevels must list at least one id.
+    """
+    admin_levels = collection_params.get("AdminLevels")
+    if not admin_levels:
+        raise ValueError(
+            "The collection needs a list of AdminLevels to be split by region."
+        )
+
+    regions = {}
+    for admin_level in admin_levels:
+        # generate_collection modifies the definition it is given, so every region gets its own copy
+        region_params = copy.deepcopy(collection_params)
+        region_params["AdminLevels"] = [admin_level]
+        region_params["Label"] = f"{collection_params.get('Label', '')} - {admin_level}"
+        regions[admin_level] = region_params
+    return regions
+
+
+def get_shard_file(shard_dir: str, admin_level: int):
+    return os.path.join(shard_dir, f"region_{admin_level}.csv")
+
+
+def get_collections_file(shard_dir: str):
+    return os.path.join(shard_dir, "collections.json")
+
+
+def load_region_collections(shard_dir: str):
+    """
+    Returns the sub-collections created by previous runs, as a dict of admin level id -> {"CollectionId", "Params"}.
+    """
+    collections_file = get_collections_file(shard_dir)
+    if not os.path.exists(collections_file):
+        return {}
+    with open(collections_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_region_collections(shard_dir: str, collections: dict):
+    collections_file = get_collections_file(shard_dir)
+    with open(collections_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(collections, f, indent=2)
+    os.replace(collections_file + ".tmp", collections_file)
+
+
+def download_region(
+    cxy_api_key: str,
+    admin_level: int,
+    region_params: dict,
+    shard_dir: str,
+    data_date: str = None,
+    check_frequency: float = 1,
+    collections: dict = None,
+    lock: threading.Lock = None,
+):
+    """
+    Creates (or reuses) and downloads the sub-collection of one region. Returns the path of its shard.
+    collections:dict - optional, sub-collections created by previous runs (see load_region_collections). The collection of the region
+        is reused if its definition did not change, otherwise a new one is created and recorded in collections.json.
+    lock:threading.Lock - lock guarding collections when regions are downloaded in parallel
+    """
+    collections = {} if collections is None else collections
+    lock = lock or threading.Lock()
+    # keys are strings once saved as json
+    saved = collections.get(str(admin_level))
+    if saved and saved["Params"] == region_params:
+        collection_id = saved["CollectionId"]
+    else:
+        # generate_collection modifies the definition it is given, the original one is recorded
+        collection_id = generate_collection(cxy_api_key, copy.deepcopy(region_params))
+        with lock:
+            collections[str(admin_level)] = {
+                "CollectionId": collection_id,
+                "Params": region_params,
+            }
+            save_region_collections(shard_dir, collections)
+    collection_download_url = download_collection(
+        cxy_api_key, collection_id, data_date, check_frequency
+    )
+    if not collection_download_url:
+        raise ValueError(f"Download of the collection of region {admin_level} failed.")
+
+    shard_file = get_shard_file(shard_dir, admin_level)
+    # the shard only replaces the previous one once it is complete
+    download_file(collection_download_url, shard_file + ".part")
+    os.replace(shard_file + ".part", shard_file)
+    return shard_file
+
+
+def merge_shards(shard_files: list, output_file: str, key_field: str = "Id"):
+    """
+    Stream-merges the region CSVs into output_file, keeping only the first occurrence of every location Id
+    (a location can be part of several overlapping regions, e.g. a country and one of its states). Returns the number of locations written.
+    """
+    fieldnames = []
+    for shard_file in shard_files:
+        with open(shard_file, "r", encoding="utf-8-sig", newline="") as f:
+            for field in csv.DictReader(f).fieldnames or []:
+                if field not in fieldnames:
+                    fieldnames.append(field)
+
+    seen_ids = set()
+    with open(output_file + ".part", "w", encoding="utf-8", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=fieldnames)
+        writer.writeheader()
+        for shard_file in shard_files:
+            with open(shard_file, "r", encoding="utf-8-sig", newline="") as f:
+                for row in csv.DictReader(f):
+                    if row[key_field] in seen_ids:
+                        continue
+                    seen_ids.add(row[key_field])
+                    writer.writerow(row)
+    os.replace(output_file + ".part", output_file)
+
+    print(
+        f"Merged {len(shard_files)} regions into {output_file}: {len(seen_ids)} locations"
+    )
+    return len(seen_ids)
+
+
+def fan_out_collection(
+    cxy_api_key: str,
+    collection_params: dict,
+    output_file: str,
+    shard_dir: str,
+    regions: list = None,
+    max_workers: int = 4,
+    data_date: str = None,
+    check_frequency: float = 1,
+):
+    """
+    Downloads a collection region by region in parallel and merges the regions into output_file. Returns the paths of the region shards.
+    cxy_api_key:str - ChainXY API Key
+    collection_params: dict - definition of the collection, including the AdminLevels to split it by
+    output_file:str - path of the merged CSV
+    shard_dir:str - directory where the CSV of every region is kept, along with collections.json, the ids of the region sub-collections
+        reused by later runs instead of creating new collections
+    regions:list - optional, admin level ids of the regions to refresh. The other regions reuse their existing shard,
+        regions without a shard or whose definition changed are always downloaded. By default all the regions are downloaded.
+    max_workers:int - number of regions created and downloaded at the same time
+    data_date:str - vintage of the data to be downloaded (YYYY-MM-DD)
+    check_frequency:float - delay (in seconds) between successive checks of the status of the downloads
+    """
+    check_api_key(cxy_api_key)
+    os.makedirs(shard_dir, exist_ok=True)
+    region_params = split_collection_by_region(collection_params)
+    collections = load_region_collections(shard_dir)
+    lock = threading.Lock()
+
+    to_download = [
+        admin_level
+        for admin_level in region_params
+        if regions is None
+        or admin_level in regions
+        or not os.path.exists(get_shard_file(shard_dir, admin_level))
+        # a shard built from an older definition of the region is never merged with the new ones
+        or collections.get(str(admin_level), {}).get("Params")
+        != region_params[admin_level]
+    ]
+    print(
+        f"Downloading {len(to_download)} of {len(region_params)} regions, {max_workers} at a time..."
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises the error of a failed region, before anything is merged
+        list(
+            executor.map(
+                lambda admin_level: download_region(
+                    cxy_api_key,
+                    admin_level,
+                    region_params[admin_level],
+                    shard_dir,
+                    data_date,
+                    check_frequency,
+                    collections,
+                    lock,
+                ),
+                to_download,
+            )
+        )
+
+    shard_files = [
+        get_shard_file(shard_dir, admin_level) for admin_level in region_params
+    ]
+    merge_shards(shard_files, output_file)
+    return shard_files
+
+
+def main():
+    # FILL THESE
+    # your chainxy api key
+    cxy_api_key = ""
+    # definition of the collection, see createCollectionAndDownload.py
+    collection_params = {
+        "Label": "",
+        "AdminLevels": [],  # list of geographic entity ids e.g., [20982, 20803] to include US, Canada -- one sub-collection is created per id
+        "ChainsQuery": {},
+    }
+    # path of the merged CSV, and directory where the CSV of every region is kept
+    output_file = r""
+    shard_dir = r""
+    # optional - admin level ids of the regions to refresh, leave None to download every region
+    regions = None
+    # number of regions created and downloaded at the same time
+    max_workers = 4
+
+    fan_out_collection(
+        cxy_api_key, collection_params, output_file, shard_dir, regions, max_workers
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -67,7 +67,7 @@ def download_nearest_report(cxy_api_key, report_params):
     return check_report_status(cxy_api_key, download_id)
 
 
-def download_void_analysis_report(cxy_api_key, report_params):
+def download_void_analysis_report(cxy_api_key, target_collection_id, report_params):
     """
     Download the Void Analysis (VA) report based on the provided parameters.
     """
@@ -215,7 +215,7 @@ def main():
         )
     elif report_type == "void_analysis":
         report_url = download_void_analysis_report(
-            cxy_api_key, void_analysis_report_params
+            cxy_api_key, target_collection_id, void_analysis_report_params
         )
 
     print(f"Download URL: {report_url}")
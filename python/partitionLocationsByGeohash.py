@@ -0,0 +1,327 @@
+# this script writes downloaded locations into a directory partitioned by geohash prefix, and answers bounding box queries
+# by reading only the partitions that overlap the box. The bounding box uses the same North/East/South/West parameters as api/Locations
+# (see list_locations_by_last_scrape_date in DownloadLocationsByLastUpdate.py), so the cost of a regional query depends on the size of the region
+# rather than the size of the whole download.
+import bisect
+import csv
+import json
+import os
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int):
+    """
+    Returns the geohash of a point with the given number of characters.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash bits alternate between longitude and latitude, starting with longitude
+
+    while len(geohash) < precision:
+        value_range, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            value_range[0] = middle
+        else:
+            bits = bits << 1
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def decode_geohash_bounds(geohash: str):
+    """
+    Returns the (north, east, south, west) bounds of the cell covered by a geohash.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        bits = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+
+    return lat_range[1], lon_range[1], lat_range[0], lon_range[0]
+
+
+def longitude_in_box(longitude: float, east: float, west: float):
+    """
+    Returns true if a longitude is between west and east. A box with west > east crosses the antimeridian.
+    """
+    if west <= east:
+        return west <= longitude <= east
+    return longitude >= west or longitude <= east
+
+
+def cell_overlaps_box(
+    cell: tuple, north: float, east: float, south: float, west: float
+):
+    """
+    Returns true if a (north, east, south, west) geohash cell overlaps the bounding box.
+    """
+    cell_north, cell_east, cell_south, cell_west = cell
+    if cell_south > north or cell_north < south:
+        return False
+    if west <= east:
+        return cell_west <= east and cell_east >= west
+    # the box crosses the antimeridian, i.e. it is the union of [west, 180] and [-180, east]
+    return cell_east >= west or cell_west <= east
+
+
+def read_records(source):
+    """
+    Yields location records from a list of dicts (e.g. the output of list_locations_by_last_scrape_date) or from the path of a CSV file.
+    """
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+    else:
+        yield from source
+
+
+def write_partitions(
+    source,
+    output_dir: str,
+    precision: int = 3,
+    latitude_field: str = "Latitude",
+    longitude_field: str = "Longitude",
+    overwrite: bool = True,
+    chunk_rows: int = 100000,
+):
+    """
+    Writes location records into one CSV per geohash prefix and returns the number of records per partition.
+    Existing partitions are replaced, unless overwrite is False.
+    source - list of location dicts, or the path of a downloaded locations CSV
+    output_dir:str - directory of the partitions
+    precision:int - length of the geohash prefix of a partition, e.g. 2 (~1250km cells), 3 (~156km), 4 (~39km)
+    latitude_field, longitude_field:str - names of the coordinate fields of the records
+    overwrite:bool - if True (default), existing partitions in output_dir are deleted first. If False, the records are appended to the
+        existing partitions, e.g. to add a second download; records are not de-duplicated, so never append the same source twice
+    chunk_rows:int - number of records buffered in memory before they are appended to the partition files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    meta_file = os.path.join(output_dir, "partitions.json")
+
+    meta = None
+    if os.path.exists(meta_file) and not overwrite:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["Precision"] != precision:
+            raise ValueError(
+                f"{output_dir} is partitioned with precision {meta['Precision']}, pass overwrite=True to re-partition it with precision {precision}."
+            )
+    elif overwrite:
+        for file_name in os.listdir(output_dir):
+            if file_name.endswith(".csv") or file_name == "partitions.json":
+                os.remove(os.path.join(output_dir, file_name))
+
+    fieldnames = meta["Fields"] if meta else None
+    counts = {}
+    skipped = 0
+    buffered = {}
+    buffered_rows = 0
+
+    def flush():
+        for partition, rows in buffered.items():
+            partition_file = os.path.join(output_dir, f"{partition}.csv")
+            is_new = not os.path.exists(partition_file)
+            with open(partition_file, "a", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+                if is_new:
+                    writer.writeheader()
+                writer.writerows(rows)
+        buffered.clear()
+
+    for record in read_records(source):
+        if fieldnames is None:
+            fieldnames = list(record)
+        try:
+            latitude = float(record[latitude_field])
+            longitude = float(record[longitude_field])
+        except (KeyError, TypeError, ValueError):
+            skipped += 1
+            continue
+
+        partition = encode_geohash(latitude, longitude, precision)
+        buffered.setdefault(partition, []).append(record)
+        counts[partition] = counts.get(partition, 0) + 1
+        buffered_rows += 1
+        if buffered_rows >= chunk_rows:
+            flush()
+            buffered_rows = 0
+    flush()
+
+    if fieldnames is not None:
+        # the geohashes of the partitions, so queries never have to list the directory
+        partitions = set(load_partition_names(output_dir) if meta else []) | set(counts)
+        with open(meta_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "Precision": precision,
+                    "Fields": fieldnames,
+                    "LatitudeField": latitude_field,
+                    "LongitudeField": longitude_field,
+                    "Partitions": sorted(partitions),
+                },
+                f,
+                indent=2,
+            )
+
+    if skipped:
+        print(f"Skipped {skipped} records without valid coordinates.")
+    print(
+        f"Wrote {sum(counts.values())} records into {len(counts)} partitions in {output_dir}"
+    )
+    return counts
+
+
+def cell_inside_box(
+    cell: tuple, north: float, east: float, south: float, west: float
+):
+    """
+    Returns true if a (north, east, south, west) geohash cell lies entirely inside the bounding box.
+    """
+    cell_north, cell_east, cell_south, cell_west = cell
+    if cell_south < south or cell_north > north:
+        return False
+    if west <= east:
+        return cell_west >= west and cell_east <= east
+    # geohash cells never cross the antimeridian, so the cell is inside one of the two halves of the box
+    return cell_west >= west or cell_east <= east
+
+
+def load_partition_names(output_dir: str):
+    """
+    Returns the sorted geohashes of the partitions of a directory, from partitions.json or, for older stores, from the directory listing.
+    """
+    with open(os.path.join(output_dir, "partitions.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if "Partitions" in meta:
+        return meta["Partitions"]
+    return sorted(
+        file_name[:-4]
+        for file_name in os.listdir(output_dir)
+        if file_name.endswith(".csv")
+    )
+
+
+def list_overlapping_partitions(
+    output_dir: str,
+    north: float,
+    east: float,
+    south: float,
+    west: float,
+    partitions: list = None,
+):
+    """
+    Returns the paths of the existing partition files whose geohash cell overlaps the bounding box.
+    Cells are refined one character at a time, and a cell stops being refined as soon as no partition starts with its geohash
+    or it lies entirely inside the box (all the partitions under it are then selected), so the work depends on the number of
+    partitions along the edge of the box, not on the number of cells in it.
+    partitions:list - sorted geohashes of the partitions, read from partitions.json by default
+    """
+    partitions = load_partition_names(output_dir) if partitions is None else partitions
+    # '~' sorts after every character of the geohash alphabet, so [prefix, prefix + '~') holds every geohash starting with prefix
+    def partitions_under(prefix):
+        return bisect.bisect_left(partitions, prefix), bisect.bisect_left(
+            partitions, prefix + "~"
+        )
+
+    selected = []
+    prefixes = [""]
+    while prefixes:
+        refined = []
+        for prefix in prefixes:
+            for char in GEOHASH_ALPHABET:
+                geohash = prefix + char
+                first, last = partitions_under(geohash)
+                if first == last:
+                    continue
+                cell = decode_geohash_bounds(geohash)
+                if not cell_overlaps_box(cell, north, east, south, west):
+                    continue
+                if partitions[first] == geohash or cell_inside_box(
+                    cell, north, east, south, west
+                ):
+                    selected.extend(partitions[first:last])
+                else:
+                    refined.append(geohash)
+        prefixes = refined
+
+    return [os.path.join(output_dir, f"{geohash}.csv") for geohash in sorted(selected)]
+
+
+def query_locations(
+    output_dir: str,
+    north: float = 90,
+    east: float = 180,
+    south: float = -90,
+    west: float = -180,
+):
+    """
+    Returns the location records inside a bounding box, reading only the partitions that overlap it.
+    output_dir:str - directory of the partitions written by write_partitions()
+    north, east, south, west:float - points of the search area, as in the api/Locations endpoint
+    """
+    with open(os.path.join(output_dir, "partitions.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    latitude_field = meta["LatitudeField"]
+    longitude_field = meta["LongitudeField"]
+
+    records = []
+    partitions = list_overlapping_partitions(
+        output_dir, north, east, south, west, meta.get("Partitions")
+    )
+    for partition_file in partitions:
+        with open(partition_file, "r", encoding="utf-8", newline="") as f:
+            for record in csv.DictReader(f):
+                latitude = float(record[latitude_field])
+                longitude = float(record[longitude_field])
+                # partitions on the edge of the box also contain locations outside of it
+                if south <= latitude <= north and longitude_in_box(
+                    longitude, east, west
+                ):
+                    records.append(record)
+
+    print(f"Found {len(records)} locations in {len(partitions)} partitions.")
+    return records
+
+
+def main():
+    # FILL THESE
+    # path of a downloaded locations CSV, or the output of list_locations_by_last_scrape_date()
+    source = r""
+    # directory of the partitions
+    output_dir = r""
+    # length of the geohash prefix of a partition
+    precision = 3
+    # Boundaries of search
+    north = 90
+    east = 180
+    south = -90
+    west = -180
+
+    write_partitions(source, output_dir, precision)
+    locations = query_locations(output_dir, north, east, south, west)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# this script sample processes a collection download generated with splitLayers=True, in which every chain is a separate CSV inside a zip archive.
+# The chain files are streamed out of the archive and processed in parallel on all cores; the output is one shard per chain plus an index,
+# so consumers can load only the chains they need.
+import requests
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def download_archive(url: str, output_file: str):
+    """
+    Downloads a split-layer archive to path output_file.
+    """
+    # NOTE the stream=True parameter below
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        with open(output_file, "wb") as f:
+            for chunk in r.iter_content(chunk_size=8192):
+                f.write(chunk)
+
+    print(f"Saved {url}\nto\n{output_file}")
+    return output_file
+
+
+def get_shard_name(member_name: str):
+    """
+    Returns a file-system safe shard name for an archive member, e.g. 'Walmart USA.csv' -> 'Walmart_USA-3f1c9a2b'.
+    The suffix is a hash of the full member name, so members that only differ by punctuation or directory get different shards.
+    """
+    name = os.path.splitext(os.path.basename(member_name))[0]
+    name = re.sub(r"[^\w\-]+", "_", name).strip("_") or "layer"
+    return f"{name}-{hashlib.sha1(member_name.encode('utf-8')).hexdigest()[:8]}"
+
+
+def process_chain_file(archive_file: str, member_name: str, output_dir: str):
+    """
+    Parses one chain CSV from the archive, converts it to a gzipped JSON lines shard and returns its index entry.
+    The member is read as a stream, it is never extracted to disk.
+    archive_file:str - path of the split-layer zip archive
+    member_name:str - name of the chain CSV inside the archive
+    output_dir:str - directory where the shard is written
+    """
+    shard_name = get_shard_name(member_name)
+    shard_file = os.path.join(output_dir, f"{shard_name}.jsonl.gz")
+
+    record_count = 0
+    # Id range and bounding box are kept as running values, so memory does not grow with the size of the chain
+    min_id = max_id = None
+    north = east = south = west = None
+    chain_ids = set()
+    columns = []
+
+    with zipfile.ZipFile(archive_file) as archive:
+        with archive.open(member_name) as member:
+            reader = csv.DictReader(
+                io.TextIOWrapper(member, encoding="utf-8-sig", newline="")
+            )
+            columns = reader.fieldnames or []
+            # write to a temporary name first, so an interrupted run never leaves a truncated shard behind
+            with gzip.open(shard_file + ".tmp", "wt", encoding="utf-8") as out:
+                for row in reader:
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    record_count += 1
+                    if row.get("Id"):
+                        location_id = int(row["Id"])
+                        if min_id is None:
+                            min_id = max_id = location_id
+                        else:
+                            min_id = min(min_id, location_id)
+                            max_id = max(max_id, location_id)
+                    if row.get("ChainId"):
+                        chain_ids.add(int(row["ChainId"]))
+                    try:
+                        latitude = float(row["Latitude"])
+                        longitude = float(row["Longitude"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    if north is None:
+                        north = south = latitude
+                        east = west = longitude
+                    else:
+                        north = max(north, latitude)
+                        south = min(south, latitude)
+                        east = max(east, longitude)
+                        west = min(west, longitude)
+    os.replace(shard_file + ".tmp", shard_file)
+
+    return {
+        "Layer": member_name,
+        "File": os.path.basename(shard_file),
+        "Columns": columns,
+        "RecordCount": record_count,
+        "ChainIds": sorted(chain_ids),
+        "MinId": min_id,
+        "MaxId": max_id,
+        # North, East, South, West of the chain's locations, the same order used by the api/Locations bounding box
+        "BoundingBox": [north, east, south, west] if north is not None else None,
+    }
+
+
+def process_split_layer_download(
+    archive: str, output_dir: str, max_workers: int = None
+):
+    """
+    Processes every chain CSV of a split-layer collection download in parallel and writes an index.json describing the shards.
+    Returns the index entries.
+    archive:str - path or URL of the split-layer zip archive (the URL returned by download_collection(..., split_layers=True))
+    output_dir:str - directory where the per-chain shards and the index are written
+    max_workers:int - number of worker processes, defaults to the number of cores
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    temp_dir = None
+    if archive.lower().startswith(("http://", "https://")):
+        temp_dir = tempfile.TemporaryDirectory()
+        archive = download_archive(archive, os.path.join(temp_dir.name, "layers.zip"))
+
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            members = [
+                info.filename
+                for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".csv")
+            ]
+        print(f"Processing {len(members)} chain files...")
+
+        index = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(process_chain_file, archive, member, output_dir)
+                for member in members
+            ]
+            for future in as_completed(futures):
+                entry = future.result()
+                print(f"Processed {entry['Layer']} ({entry['RecordCount']} records)")
+                index.append(entry)
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+    index.sort(key=lambda entry: entry["File"])
+    with open(os.path.join(output_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    print(f"Wrote {len(index)} shards to {output_dir}")
+    return index
+
+
+def load_chains(output_dir: str, chain_ids: list = None, layers: list = None):
+    """
+    Loads the records of the selected chains from the shards written by process_split_layer_download(). Only the matching shards are read.
+    output_dir:str - directory containing the shards and index.json
+    chain_ids:list - optional, list of Chain ids:int to load
+    layers:list - optional, list of layer (archive member) names to load
+    """
+    with open(os.path.join(output_dir, "index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+
+    records = []
+    for entry in index:
+        if chain_ids and not set(chain_ids) & set(entry["ChainIds"]):
+            continue
+        if layers and entry["Layer"] not in layers:
+            continue
+        with gzip.open(
+            os.path.join(output_dir, entry["File"]), "rt", encoding="utf-8"
+        ) as f:
+            for line in f:
+                record = json.loads(line)
+                if (
+                    chain_ids
+                    and record.get("ChainId")
+                    and int(record["ChainId"]) not in chain_ids
+                ):
+                    continue
+                records.append(record)
+    return records
+
+
+def main():
+    # FILL THESE
+    # path or URL of a collection download generated with split layers, e.g.
+    # download_collection(cxy_api_key, collection_id, split_layers=True) in createCollectionAndDownload.py
+    archive = ""
+    # directory where the per-chain shards are written
+    output_dir = ""
+    # optional - number of worker processes, defaults to the number of cores
+    max_workers = None
+
+    process_split_layer_download(archive, output_dir, max_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# this script runs a batch of ChainXY jobs described in a job spec file (JSON, or YAML if the pyyaml package is installed).
+# Jobs can create collections, download collections, generate reports and run local post-processing steps.
+# Jobs run on a bounded worker pool as soon as the jobs they depend on are finished, so independent jobs overlap.
+#
+# Example job spec:
+# {
+#     "max_workers": 4,
+#     "jobs": [
+#         {"name": "qsr", "type": "collection", "params": {"Label": "QSR", "ChainsQuery": {"Categories": {"Id": [180]}}}},
+#         {"name": "qsr_csv", "type": "download", "params": {"collection_id": "${qsr}", "output_file": "qsr.csv"}},
+#         {"name": "qsr_cot", "type": "report", "report_type": "changes_over_time", "params": {"collection_id": "${qsr}", "report_params": {...}}},
+#         {"name": "qsr_load", "type": "python", "params": {"function": "myModule:load_csv", "args": ["${qsr_csv}"]}},
+#         {"name": "notify", "type": "command", "depends_on": ["qsr_load", "qsr_cot"], "params": {"command": ["echo", "done"]}}
+#     ]
+# }
+#
+# A string "${job_name}" is replaced by the result of that job (collection id, download url or file path, report url, ...),
+# and implies a dependency on it. Additional dependencies can be listed in "depends_on".
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import createCollectionAndDownload
+import createCollectionDownload
+import generateReports
+
+REFERENCE_PATTERN = re.compile(r"\$\{([^}]+)\}")
+
+
+def load_job_spec(spec_file: str):
+    """
+    Reads a job spec file. Files ending in .yaml or .yml require the pyyaml package.
+    """
+    with open(spec_file, "r", encoding="utf-8") as f:
+        if spec_file.lower().endswith((".yaml", ".yml")):
+            import yaml
+
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if not isinstance(spec, dict) or not isinstance(spec.get("jobs"), list):
+        raise ValueError(f"The job spec {spec_file} must contain a list of 'jobs'.")
+    return spec
+
+
+def find_references(value):
+    """
+    Returns the names of the jobs referenced with ${job_name} anywhere in value.
+    """
+    if isinstance(value, str):
+        return set(REFERENCE_PATTERN.findall(value))
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        names = set()
+        for item in value:
+            names |= find_references(item)
+        return names
+    return set()
+
+
+def resolve_references(value, results: dict):
+    """
+    Replaces ${job_name} references in value with the results of the finished jobs.
+    A string that is a single reference is replaced by the result itself, so ids keep their type.
+    """
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.fullmatch(value)
+        if match:
+            return results[match.group(1)]
+        return REFERENCE_PATTERN.sub(lambda m: str(results[m.group(1)]), value)
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    return value
+
+
+def build_dependencies(jobs: list):
+    """
+    Validates the jobs and returns a dict of job name -> set of names of the jobs it depends on.
+    """
+    names = [job.get("name") for job in jobs]
+    if not all(isinstance(name, str) and name for name in names):
+        raise ValueError("Every job needs a 'name'.")
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Job names must be unique. Duplicates: {sorted(duplicates)}")
+
+    dependencies = {}
+    for job in jobs:
+        depends_on = set(job.get("depends_on", []))
+        depends_on |= find_references(job.get("params", {}))
+        unknown = depends_on - set(names)
+        if unknown:
+            raise ValueError(
+                f"Job '{job['name']}' depends on unknown jobs: {sorted(unknown)}"
+            )
+        dependencies[job["name"]] = depends_on
+
+    # reject cycles, they would never become ready
+    visited = set()
+    visiting = set()
+
+    def visit(name):
+        if name in visiting:
+            raise ValueError(
+                f"The job spec contains a dependency cycle through '{name}'."
+            )
+        if name in visited:
+            return
+        visiting.add(name)
+        for dependency in dependencies[name]:
+            visit(dependency)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in names:
+        visit(name)
+    return dependencies
+
+
+def run_collection_job(cxy_api_key: str, params: dict):
+    """
+    Creates a collection, params is the collection definition passed to generate_collection(). Returns the collection id.
+    """
+    return createCollectionAndDownload.generate_collection(cxy_api_key, dict(params))
+
+
+def run_download_job(cxy_api_key: str, params: dict):
+    """
+    Downloads a chain or center collection. Returns the path of the saved file if output_file is given, otherwise the download URL.
+    """
+    collection_download_url = createCollectionDownload.download_collection(
+        cxy_api_key,
+        params["collection_id"],
+        params.get("collection_type", "chain"),
+        params.get("cache_time", 24),
+        params.get("url_params", {}),
+        params.get("data_date", ""),
+        params.get("check_frequency", 1),
+    )
+    if not collection_download_url:
+        raise ValueError(f"Download of collection {params['collection_id']} failed.")
+    if params.get("output_file"):
+        # chain collections are decompressed while they are downloaded, center collections are saved as zip archives
+        return createCollectionDownload.download_file(
+            collection_download_url,
+            params["output_file"],
+            decompress=params.get("collection_type", "chain") == "chain",
+        )
+    return collection_download_url
+
+
+def run_report_job(cxy_api_key: str, report_type: str, params: dict):
+    """
+    Generates a report. Returns the path of the saved file if output_file is given, otherwise the report URL.
+    """
+    report_params = params.get("report_params", {})
+    if report_type == "changes_over_time":
+        report_url = generateReports.download_changes_over_time_report(
+            cxy_api_key, params["collection_id"], report_params
+        )
+    elif report_type == "nearest_neighbor":
+        report_url = generateReports.download_nearest_report(
+            cxy_api_key, report_params
+        )
+    elif report_type == "void_analysis":
+        report_url = generateReports.download_void_analysis_report(
+            cxy_api_key, params["target_collection_id"], report_params
+        )
+    else:
+        raise ValueError(
+            f"Invalid report type '{report_type}'. Choose from ('changes_over_time', 'nearest_neighbor', 'void_analysis')"
+        )
+
+    if not report_url:
+        raise ValueError(f"Generation of the {report_type} report failed.")
+    if params.get("output_file"):
+        return generateReports.download_file(report_url, params["output_file"])
+    return report_url
+
+
+def run_command_job(params: dict):
+    """
+    Runs a local command, given as a list of arguments. Returns its standard output.
+    """
+    completed = subprocess.run(
+        params["command"],
+        cwd=params.get("cwd"),
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return completed.stdout.strip()
+
+
+def run_python_job(params: dict):
+    """
+    Calls a python function, given as "module:function", e.g. "processSplitLayerDownload:process_split_layer_download". Returns its result.
+    """
+    module_name, function_name = params["function"].split(":")
+    function = getattr(importlib.import_module(module_name), function_name)
+    return function(*params.get("args", []), **params.get("kwargs", {}))
+
+
+def run_job(cxy_api_key: str, job: dict, results: dict):
+    """
+    Runs a single job after resolving the references to the results of its dependencies.
+    """
+    params = resolve_references(job.get("params", {}), results)
+    job_type = job.get("type")
+
+    if job_type == "collection":
+        return run_collection_job(cxy_api_key, params)
+    elif job_type == "download":
+        return run_download_job(cxy_api_key, params)
+    elif job_type == "report":
+        return run_report_job(cxy_api_key, job.get("report_type"), params)
+    elif job_type == "command":
+        return run_command_job(params)
+    elif job_type == "python":
+        return run_python_job(params)
+    raise ValueError(
+        f"Job '{job['name']}' has an invalid type '{job_type}'. Choose from ('collection', 'download', 'report', 'command', 'python')"
+    )
+
+
+def run_jobs(cxy_api_key: str, jobs: list, max_workers: int = 4):
+    """
+    Runs the jobs as a dependency graph on a pool of max_workers threads. A job starts as soon as all of its dependencies have finished;
+    jobs depending on a failed job are skipped. Returns a dict of job name -> result, and a dict of job name -> error for failed or skipped jobs.
+    cxy_api_key:str - ChainXY API Key
+    jobs:list - list of job definitions, see the example at the top of this file
+    max_workers:int - max. number of jobs running at the same time
+    """
+    dependencies = build_dependencies(jobs)
+    jobs_by_name = {job["name"]: job for job in jobs}
+    pending = set(jobs_by_name)
+    results = {}
+    errors = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in sorted(pending):
+                failed = dependencies[name] & set(errors)
+                if failed:
+                    errors[name] = f"skipped, depends on failed jobs {sorted(failed)}"
+                    print(f"Job '{name}' {errors[name]}")
+                    pending.discard(name)
+                elif dependencies[name] <= set(results):
+                    print(f"Starting job '{name}'...")
+                    future = executor.submit(
+                        run_job, cxy_api_key, jobs_by_name[name], dict(results)
+                    )
+                    running[future] = name
+                    pending.discard(name)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    print(f"Job '{name}' finished: {results[name]}")
+                except Exception as e:
+                    errors[name] = repr(e)
+                    print(f"Job '{name}' failed: {errors[name]}")
+
+    return results, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Runs the ChainXY jobs described in a JSON or YAML job spec file."
+    )
+    parser.add_argument("spec_file", help="path of the job spec file")
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="max. number of jobs running at the same time, overrides max_workers of the job spec",
+    )
+    parser.add_argument(
+        "--results-file",
+        help="optional path of a json file where the job results are saved",
+    )
+    args = parser.parse_args()
+
+    spec = load_job_spec(args.spec_file)
+    # the api key can be kept out of the job spec by setting the CXY_API_KEY environment variable
+    cxy_api_key = spec.get("api_key") or os.environ.get("CXY_API_KEY", "")
+    max_workers = args.max_workers or spec.get("max_workers", 4)
+
+    results, errors = run_jobs(cxy_api_key, spec["jobs"], max_workers)
+
+    if args.results_file:
+        with open(args.results_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {"results": results, "errors": errors}, f, indent=2, default=str
+            )
+
+    print(f"Finished {len(results)} jobs, {len(errors)} failed or skipped.")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# this script keeps a local copy of the locations of a set of chains up to date.
+# Instead of re-downloading everything on a timer, it periodically requests only the Id and LastScrapeDate of the chains,
+# and refreshes the locations of the chains that were scraped since the previous check, merging them into the local copy.
+# The cost of a refresh therefore follows the number of chains that actually changed.
+import requests
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+from DownloadLocationsByLastUpdate import check_api_key, list_locations_by_id_shards
+
+
+def get_collection_chains_query(cxy_api_key: str, collection_id: int):
+    """
+    Returns a ChainsQuery object selecting the chains of a chain collection: its list of chains, or its own ChainsQuery.
+    The collection is read at every check, so chains added to it are downloaded and the locations of chains removed from it
+    are dropped from the local copy.
+    cxy_api_key:str - ChainXY API Key
+    collection_id:int - ID of the chain collection
+    """
+    headers = {
+        "x-apikey": cxy_api_key,
+        "x-Application": "Python API Call",
+        "content-type": "application/json",
+    }
+    response = requests.get(
+        url=f"https://location.chainxy.com/api/ChainLists/{collection_id}",
+        headers=headers,
+    )
+    response.raise_for_status()
+    r_body = response.json()
+    collection = r_body.get("Record", r_body)
+
+    chains = collection.get("Chains")
+    if chains:
+        return {"Id": [chain["Id"] for chain in chains]}
+    chains_query = collection.get("ChainsQuery") or "{}"
+    # the ChainsQuery of a collection is stored as a json string
+    return json.loads(chains_query) if isinstance(chains_query, str) else chains_query
+
+
+def get_chain_scrape_dates(
+    cxy_api_key: str,
+    chain_ids: list = None,
+    chains_query: dict = None,
+    limit: int = 1000,
+):
+    """
+    Returns a dict of chain id -> LastScrapeDate for the selected chains. Only these two fields are requested.
+    cxy_api_key:str - ChainXY API Key
+    chain_ids:list - list of Chain ids:int
+    chains_query:dict - OR a ChainsQuery object selecting the chains, the same filter used to define a collection (see createCollectionAndDownload.py)
+    limit:int - number of chains requested per page
+    """
+    if chain_ids and chains_query:
+        raise ValueError(
+            f"The list of chains and a chains query can't be both specified at once. Current values: {chain_ids=}, {chains_query=}"
+        )
+    headers = {
+        "x-apikey": cxy_api_key,
+        "x-Application": "Python API Call",
+        "content-type": "application/json",
+    }
+    query = {"Id": chain_ids} if chain_ids else (chains_query or {})
+
+    scrape_dates = {}
+    page = 0
+    pages = 1
+    while page < pages:
+        params = {
+            "Query": json.dumps(query, separators=(",", ":")),
+            "Fields": "Id,LastScrapeDate",
+            "OrderBy": "Id",
+            "Limit": limit,
+            "Page": page,
+        }
+        response = requests.get(
+            url="https://location.chainxy.com/api/Chains",
+            params=params,
+            headers=headers,
+        )
+        response.raise_for_status()
+        r_body = response.json()
+        for record in r_body["Records"]:
+            scrape_dates[str(record["Id"])] = record["LastScrapeDate"]
+        pages = r_body.get("Pages", 0)
+        page += 1
+
+    return scrape_dates
+
+
+def detect_changed_chains(previous: dict, current: dict):
+    """
+    Returns the ids of the chains that are new or were scraped since the previous check, grouped by the date from which
+    their locations have to be refreshed (None for chains without a previous scrape date, i.e. a full download).
+    previous:dict - chain id -> LastScrapeDate of the previous check
+    current:dict - chain id -> LastScrapeDate of the current check
+    """
+    changes = {}
+    for chain_id, scrape_date in current.items():
+        previous_date = previous.get(chain_id)
+        if previous_date and previous_date == scrape_date:
+            continue
+        since = previous_date[:10] if previous_date else None
+        changes.setdefault(since, []).append(chain_id)
+    return changes
+
+
+def merge_locations(
+    local_file: str,
+    locations: list,
+    key_field: str = "Id",
+    removed_chain_ids: list = None,
+    chain_field: str = "ChainId",
+):
+    """
+    Merges updated location records into the local CSV: records with a known Id are replaced, new ones are appended,
+    and the records of removed_chain_ids are dropped.
+    The file is rewritten under a temporary name and swapped in, so the local copy is never left half-written.
+    Returns the number of records in the merged file.
+    """
+    removed_chain_ids = {str(chain_id) for chain_id in removed_chain_ids or []}
+    updates = {str(location[key_field]): location for location in locations}
+    fieldnames = []
+    for location in locations:
+        for field in location:
+            if field not in fieldnames:
+                fieldnames.append(field)
+
+    temp_file = local_file + ".tmp"
+    record_count = 0
+    existing = os.path.exists(local_file)
+    with open(temp_file, "w", encoding="utf-8", newline="") as out:
+        if existing:
+            with open(local_file, "r", encoding="utf-8", newline="") as f:
+                reader = csv.DictReader(f)
+                header = reader.fieldnames or []
+                fieldnames = header + [
+                    field for field in fieldnames if field not in header
+                ]
+                writer = csv.DictWriter(
+                    out, fieldnames=fieldnames, extrasaction="ignore"
+                )
+                writer.writeheader()
+                for row in reader:
+                    if row.get(chain_field) in removed_chain_ids:
+                        continue
+                    writer.writerow(updates.pop(row[key_field], row))
+                    record_count += 1
+        else:
+            writer = csv.DictWriter(out, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+        writer.writerows(updates.values())
+        record_count += len(updates)
+    os.replace(temp_file, local_file)
+    return record_count
+
+
+def load_state(state_file: str):
+    """
+    Returns the state saved by the previous check, or an empty state.
+    """
+    if not os.path.exists(state_file):
+        return {"Chains": {}, "LastCheck": None}
+    with open(state_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state_file: str, state: dict):
+    """
+    Saves the state of the current check, replacing the previous state in a single step.
+    """
+    temp_file = state_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_file, state_file)
+
+
+def refresh_changed_chains(
+    cxy_api_key: str,
+    local_file: str,
+    state_file: str,
+    chain_ids: list = None,
+    chains_query: dict = None,
+    batch_size: int = 200,
+    collection_id: int = None,
+):
+    """
+    Runs a single check: detects the chains scraped since the previous check, downloads the locations updated since then
+    and merges them into the local copy. The locations of chains that are no longer selected are removed from the local copy.
+    Returns the ids of the refreshed chains.
+    cxy_api_key:str - ChainXY API Key
+    local_file:str - path of the local CSV copy of the locations
+    state_file:str - path of the json file storing the LastScrapeDate of every chain at the previous check
+    chain_ids:list - list of Chain ids:int
+    chains_query:dict - OR a ChainsQuery object selecting the chains
+    batch_size:int - max. number of chains refreshed with a single request
+    collection_id:int - OR the ID of a chain collection, whose chains are watched
+    """
+    if collection_id is not None:
+        if chain_ids or chains_query:
+            raise ValueError(
+                f"A collection can't be combined with a list of chains or a chains query. Current values: {collection_id=}, {chain_ids=}, {chains_query=}"
+            )
+        chains_query = get_collection_chains_query(cxy_api_key, collection_id)
+    state = load_state(state_file)
+    current = get_chain_scrape_dates(cxy_api_key, chain_ids, chains_query)
+    changes = detect_changed_chains(state["Chains"], current)
+
+    refreshed = []
+    locations = []
+    for since, changed_ids in changes.items():
+        print(
+            f"Refreshing {len(changed_ids)} chains "
+            + (f"updated since {since}" if since else "without a local copy")
+        )
+        # chains are requested in batches to keep the request urls short
+        for i in range(0, len(changed_ids), batch_size):
+            batch = changed_ids[i : i + batch_size]
+            locations.extend(
+                list_locations_by_id_shards(
+                    cxy_api_key, ",".join(batch), since or "1900-01-01"
+                )
+            )
+            refreshed.extend(batch)
+
+    # chains dropped from the selection (the list, the query or the collection) since the previous check
+    removed = [chain_id for chain_id in state["Chains"] if chain_id not in current]
+    if removed:
+        print(f"Removing {len(removed)} chains that are no longer selected")
+
+    # the local copy is rewritten once per check, and only when chains changed
+    if locations or (removed and os.path.exists(local_file)):
+        record_count = merge_locations(
+            local_file, locations, removed_chain_ids=removed
+        )
+        print(
+            f"Merged {len(locations)} updated locations, {record_count} locations in {local_file}"
+        )
+    # the state is saved after the merge, so an interrupted check is repeated in full at the next one
+    for chain_id in refreshed:
+        state["Chains"][chain_id] = current[chain_id]
+    for chain_id in removed:
+        del state["Chains"][chain_id]
+    state["LastCheck"] = datetime.utcnow().isoformat()
+    save_state(state_file, state)
+    print(f"{len(refreshed)} of {len(current)} chains changed since the last check.")
+    return refreshed
+
+
+def watch(
+    cxy_api_key: str,
+    local_file: str,
+    state_file: str,
+    chain_ids: list = None,
+    chains_query: dict = None,
+    check_interval_minutes: float = 60,
+    max_checks: int = None,
+    collection_id: int = None,
+):
+    """
+    Checks for changed chains every check_interval_minutes and refreshes them, until max_checks checks were made (or forever).
+    A failed check is reported and retried at the next interval.
+    """
+    check_api_key(cxy_api_key)
+    checks = 0
+    while max_checks is None or checks < max_checks:
+        try:
+            refresh_changed_chains(
+                cxy_api_key,
+                local_file,
+                state_file,
+                chain_ids,
+                chains_query,
+                collection_id=collection_id,
+            )
+        except Exception as e:
+            # any failure (a network error, an unexpected response) only costs this check, the watcher keeps running
+            print(f"Check failed, retrying at the next interval: {e!r}")
+        checks += 1
+        if max_checks is None or checks < max_checks:
+            time.sleep(check_interval_minutes * 60)
+
+
+def main():
+    # FILL THESE
+    # your chainxy api key
+    cxy_api_key = ""
+    # Specify the chains to watch: either a list of chain_ids
+    chain_ids = []
+    # OR a ChainsQuery object, e.g., to watch Groceries & QSRs: {"Categories":{"Id":[154,180]}}
+    chains_query = None
+    # OR the id of a chain collection, to watch the chains in it
+    collection_id = None
+    # path of the local copy of the locations, and of the file storing the state of the previous check
+    local_file = r""
+    state_file = r""
+    # how often the chains are checked for new scrapes
+    check_interval_minutes = 60
+
+    watch(
+        cxy_api_key,
+        local_file,
+        state_file,
+        chain_ids,
+        chains_query,
+        check_interval_minutes,
+        collection_id=collection_id,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# helpers to consume compressed (format=ZIP_CSV) downloads while they are being transferred.
+# The zip archive is decompressed from the response stream straight into the consumer (a file, a csv reader, a converter),
+# it is never written to disk, and since the download is compressed the transfer is several times smaller than a plain CSV.
+import requests
+import io
+import struct
+import zlib
+
+LOCAL_FILE_HEADER = b"PK\x03\x04"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+# records found after the last member of an archive
+CENTRAL_DIRECTORY_RECORDS = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+
+
+class ZipStreamDecoder:
+    """
+    Decompresses a zip archive fed in chunks, in the order the chunks arrive. Members must be stored or deflated,
+    which is what the ChainXY API produces. feed() returns the decompressed data as a list of (member name, bytes) pieces.
+    With single_member=True, a ValueError is raised as soon as a second member starts.
+    """
+
+    def __init__(self, single_member: bool = False):
+        self.buffer = bytearray()
+        self.state = "header"
+        self.member = None
+        self.single_member = single_member
+
+    def feed(self, chunk: bytes):
+        self.buffer += chunk
+        pieces = []
+        while True:
+            if self.state == "header":
+                if not self.read_header():
+                    break
+            elif self.state == "data":
+                if not self.read_data(pieces):
+                    break
+            elif self.state == "descriptor":
+                if not self.read_descriptor():
+                    break
+            else:  # done, the rest of the archive is the central directory
+                self.buffer.clear()
+                break
+        return pieces
+
+    def close(self):
+        """
+        Raises a ValueError if the archive ended in the middle of a member.
+        """
+        if self.state not in ("header", "done") or self.buffer:
+            raise ValueError("The zip stream ended before the end of the archive.")
+
+    def read_header(self):
+        if len(self.buffer) < 4:
+            return False
+        signature = bytes(self.buffer[:4])
+        if signature in CENTRAL_DIRECTORY_RECORDS:
+            self.state = "done"
+            return True
+        if signature != LOCAL_FILE_HEADER:
+            raise ValueError("The stream is not a zip archive.")
+        if len(self.buffer) < 30:
+            return False
+
+        (
+            flags,
+            method,
+            crc,
+            compressed_size,
+            size,
+            name_length,
+            extra_length,
+        ) = struct.unpack("<2xHH4xIIIHH", self.buffer[4:30])
+        header_length = 30 + name_length + extra_length
+        if len(self.buffer) < header_length:
+            return False
+        name = self.buffer[30 : 30 + name_length].decode(
+            "utf-8" if flags & 0x800 else "cp437"
+        )
+        if self.single_member and self.member:
+            raise several_files_error(self.member["name"], name)
+        extra = bytes(self.buffer[30 + name_length : header_length])
+        del self.buffer[:header_length]
+
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, data_length = struct.unpack("<HH", extra[position : position + 4])
+            if header_id == 0x0001:
+                zip64 = True
+                if size == 0xFFFFFFFF and data_length >= 16:
+                    size, compressed_size = struct.unpack(
+                        "<QQ", extra[position + 4 : position + 20]
+                    )
+            position += 4 + data_length
+
+        has_descriptor = bool(flags & 0x08)
+        if method == 8:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif method == 0:
+            if has_descriptor:
+                raise ValueError(
+                    f"The size of the stored member {name} is unknown, it can't be streamed."
+                )
+            decompressor = None
+        else:
+            raise ValueError(
+                f"Member {name} uses an unsupported compression method ({method})."
+            )
+
+        self.member = {
+            "name": name,
+            "decompressor": decompressor,
+            "remaining": compressed_size,
+            "crc": crc,
+            "running_crc": 0,
+            "has_descriptor": has_descriptor,
+            "zip64": zip64,
+        }
+        self.state = "data"
+        return True
+
+    def read_data(self, pieces: list):
+        member = self.member
+        if member["decompressor"]:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            piece = member["decompressor"].decompress(data)
+            if not member["decompressor"].eof:
+                self.add_piece(pieces, piece)
+                return False
+            self.buffer += member["decompressor"].unused_data
+        else:
+            take = min(member["remaining"], len(self.buffer))
+            piece = bytes(self.buffer[:take])
+            del self.buffer[:take]
+            member["remaining"] -= take
+            if member["remaining"]:
+                self.add_piece(pieces, piece)
+                return False
+        self.add_piece(pieces, piece)
+
+        if member["has_descriptor"]:
+            self.state = "descriptor"
+        else:
+            self.check_crc(member["crc"])
+            self.state = "header"
+        return True
+
+    def read_descriptor(self):
+        if len(self.buffer) < 4:
+            return False
+        offset = 4 if self.buffer[:4] == DATA_DESCRIPTOR else 0
+        length = offset + 4 + (16 if self.member["zip64"] else 8)
+        if len(self.buffer) < length:
+            return False
+        (crc,) = struct.unpack("<I", self.buffer[offset : offset + 4])
+        del self.buffer[:length]
+        self.check_crc(crc)
+        self.state = "header"
+        return True
+
+    def add_piece(self, pieces: list, piece: bytes):
+        self.member["running_crc"] = zlib.crc32(piece, self.member["running_crc"])
+        if piece:
+            pieces.append((self.member["name"], piece))
+
+    def check_crc(self, crc: int):
+        if self.member["running_crc"] != crc:
+            raise ValueError(
+                f"Member {self.member['name']} of the zip stream is corrupted (CRC mismatch)."
+            )
+
+
+def several_files_error(first_name: str, name: str):
+    return ValueError(
+        f"The download contains several files ({first_name}, {name}, ...), process it with processSplitLayerDownload.py instead."
+    )
+
+
+def iter_zip_members(chunks):
+    """
+    Yields the decompressed (member name, bytes) pieces of a zip archive given as an iterable of byte chunks.
+    """
+    decoder = ZipStreamDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    decoder.close()
+
+
+def iter_download_chunks(url: str, chunk_size: int = 65536):
+    """
+    Yields the raw content of a download link in chunks.
+    """
+    # NOTE the stream=True parameter below
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+
+
+def iter_download_members(url: str, chunk_size: int = 65536):
+    """
+    Yields the (member name, bytes) pieces of a download as it is transferred. A zip download is decompressed on the fly;
+    any other download (e.g. format=CSV) is passed through with the member name None.
+    """
+    chunks = iter_download_chunks(url, chunk_size)
+    first = next(chunks, b"")
+    if first.startswith(LOCAL_FILE_HEADER):
+        yield from iter_zip_members(prepend(first, chunks))
+    else:
+        for chunk in prepend(first, chunks):
+            yield None, chunk
+
+
+def prepend(first: bytes, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def iter_single_member(pieces):
+    """
+    Yields the bytes of the only member of an archive, raises a ValueError if the archive contains more than one file
+    (e.g. a splitLayers download, see processSplitLayerDownload.py for those).
+    """
+    member_name = None
+    for name, piece in pieces:
+        if member_name is None:
+            member_name = name
+        elif name != member_name:
+            raise several_files_error(member_name, name)
+        yield piece
+
+
+class ChunkReader(io.RawIOBase):
+    """
+    Read-only file object over an iterator of byte chunks.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        # the current chunk and the read position in it, so a read never copies the rest of the chunk
+        self.pending = memoryview(b"")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.position >= len(self.pending):
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+            self.position = 0
+        length = min(len(buffer), len(self.pending) - self.position)
+        buffer[:length] = self.pending[self.position : self.position + length]
+        self.position += length
+        return length
+
+
+def open_download(url: str, encoding: str = "utf-8-sig"):
+    """
+    Returns a text file object reading the decompressed CSV of a download link while it is transferred, e.g.
+    csv.DictReader(open_download(url)) or pandas.read_csv(open_download(url)).
+    """
+    pieces = iter_download_members(url)
+    return io.TextIOWrapper(
+        io.BufferedReader(ChunkReader(iter_single_member(pieces))),
+        encoding=encoding,
+        newline="",
+    )
+
+
+def save_download(url: str, output_file: str):
+    """
+    Saves the decompressed content of a download link to output_file, without writing the zip archive to disk.
+    """
+    with open(output_file, "wb") as f:
+        for piece in iter_single_member(iter_download_members(url)):
+            f.write(piece)
+    return output_file